@@ -1,103 +1,110 @@
 """Set up best practices and common functionality on a Kubernetes cluster."""
 
+import typing
+
 import pulumi
 import pulumi_kubernetes as k8s
 
 import cilium
 import dns
 import gateway
+import images
+import metrics
+import metrics_server
 import oci_cache
-from utils import http_get
 
-# Setup Cilium
+Layer = typing.Literal["all", "platform", "apps"]
+
 cfg = pulumi.Config()
+layer = cfg.get("layer") or "all"
+if layer not in typing.get_args(Layer):
+    msg = f"unknown layer {layer!r}"
+    raise ValueError(msg)
 
-cilium_chart = cilium.deploy(cfg, features = {
-    "hubble",
-})
+gateway_implementation = cfg.get("gatewayImplementation") or "nginx"
+if gateway_implementation not in typing.get_args(gateway.Implementation):
+    msg = f"unknown Gateway API implementation {gateway_implementation!r}"
+    raise ValueError(msg)
 
+collect_metrics = cfg.get_bool("metrics")
+if run_benchmarks := cfg.get_bool("benchmark"):
+    import benchmark  # only loaded when enabled, it isn't by default
 
-# Setup DNS resolution
-dns.cache.deploy(cfg)
+if layer != "apps":
+    # Setup Cilium
+    cilium_deployment = cilium.deploy(cfg, features = {
+        "hubble",
+        "local-redirect-policy",
+        *(( "metrics", ) if collect_metrics else ()),
+        *(cfg.get_object("ciliumDatapath") or ()),
+        *(( "gateway-api", ) if gateway_implementation == "cilium" else ()),
+    })
 
-# Container image cache
-# TODO: depend only on cilium core
-cache = oci_cache.deploy(cfg, depends_on = ( cilium_chart, ))
+    # Container image cache
+    cache = oci_cache.deploy(cfg, depends_on = ( cilium_deployment.agent, ))
 
-# Define common dependencies: Cilium networking and the OCI cache
-# TODO: depend only on cilium core (not Hubble)
-common_deps = ( cilium_chart, *cache )
+    # Define common dependencies: pod networking, and the OCI cache serving pulls
+    #  neither Hubble, nor all cache shards, need to be ready
+    common_deps = ( cilium_deployment.agent, cache.service )
 
+    # Resource metrics, for autoscaling
+    metrics_server.deploy(depends_on = ( cilium_deployment.agent, ))
 
-# Setup Nginx Gateway Fabric, as the Gateway API implementation
-#  see https://gateway-api.sigs.k8s.io/
-gw = gateway.deploy(depends_on = common_deps)
+    # Setup the Gateway API implementation
+    #  see https://gateway-api.sigs.k8s.io/
+    gw = gateway.deploy(depends_on = common_deps, implementation = gateway_implementation)
+    routes = gw.ref
 
-# Demo application
-# adapted from https://docs.nginx.com/nginx-gateway-fabric/get-started/
-demo_ns = k8s.core.v1.Namespace("cafe")
+    # Scrape all components' metrics, and chart them, to find bottlenecks
+    if collect_metrics:
+        metrics.deploy(cfg, routes, depends_on = common_deps)
 
-for beverage in ("coffee", "tea"):
-    labels = { "beverage": beverage }
-    meta = k8s.meta.v1.ObjectMetaArgs(
-        namespace = demo_ns.metadata.name,
-        labels = labels,
-    )
+    if layer == "platform":
+        # apps' routes are declared by their own stacks: resolve any name the gateway accepts
+        routes.hostnames.add(f"*.{gateway.DOMAIN}")
 
-    dpl = k8s.apps.v1.Deployment(
-        beverage,
-        metadata = meta,
-        opts = pulumi.ResourceOptions(depends_on = common_deps),
-        spec = k8s.apps.v1.DeploymentSpecArgs(
-            replicas = 1,
-            selector = k8s.meta.v1.LabelSelectorArgs(match_labels = labels),
-            template = k8s.core.v1.PodTemplateSpecArgs(
-                metadata = k8s.meta.v1.ObjectMetaArgs(labels = labels),
-                spec = k8s.core.v1.PodSpecArgs(
-                    containers = [ k8s.core.v1.ContainerArgs(
-                        name = beverage,
-                        image = "nginxdemos/nginx-hello:plain-text",
-                        ports = [ k8s.core.v1.ContainerPortArgs(
-                            name = "http",
-                            container_port = 8080,
-                        ) ],
-                        liveness_probe = http_get("/"),
-                        readiness_probe = http_get("/"),
-                    ) ],
-                ),
-            ),
-        ),
+else:
+    # The platform is deployed, and updated, by its own stack
+    routes = gateway.GatewayRef.from_stack(
+        pulumi.StackReference(cfg.require("platformStack")), gateway_implementation,
     )
+    common_deps = ()
 
-    svc = k8s.core.v1.Service(
-        beverage,
-        metadata = meta,
-        spec = k8s.core.v1.ServiceSpecArgs(
-            ports = [ k8s.core.v1.ServicePortArgs(
-                port = 80,
-                target_port = "http",
-            ) ],
-            selector = labels,
-        ),
-    )
 
-    _ = k8s.apiextensions.CustomResource(
-        f"{beverage}-route",
-        api_version = "gateway.networking.k8s.io/v1",
-        kind = "HTTPRoute",
-        opts = pulumi.ResourceOptions(depends_on = gateway.crds()),
-        spec = {
-            "parentRefs": [ {
-                "name": "gateway",
-                "namespace": gw.namespace,
-                "sectionName": "http",
-            } ],
-            "hostnames": [ "cafe.k8s.local" ],
-            "rules": [ {
-                "backendRefs": [ {
-                    "name": svc.metadata.name,
-                    "port": 80,
-                } ],
-            } ],
-        },
-    )
+if layer != "platform":
+    # Demo application
+    # adapted from https://docs.nginx.com/nginx-gateway-fabric/get-started/
+    demo_ns = k8s.core.v1.Namespace("cafe")
+
+    services = [
+        gateway.web_service(
+            beverage, images.NGINX_HELLO, routes,
+            namespace = demo_ns.metadata.name,
+            hostnames = [ f"cafe.{gateway.DOMAIN}" ],
+            depends_on = common_deps,
+        )
+        for beverage in ("coffee", "tea")
+    ]
+
+
+if layer != "apps":
+    # Setup DNS resolution, answering for the gateway's routes from the node-local cache
+    dns_cache = dns.cache.deploy(cfg, zones = {
+        gateway.DOMAIN: gw.addresses.apply(lambda ips: dns.zone.render(
+            gateway.DOMAIN,
+            dict.fromkeys(routes.hostnames, ips),
+        )),
+    }, forwards = benchmark.dnsperf.forwards() if run_benchmarks else None, depends_on = (
+        cilium_deployment.agent, cilium_deployment.operator,
+    ))
+
+    # Optionally, measure DNS resolution
+    if run_benchmarks:
+        benchmark.dnsperf.deploy(cfg, depends_on = ( dns_cache.service, ))
+
+# Optionally, measure the request path through the gateway
+if run_benchmarks and layer != "platform":
+    benchmark.fortio.deploy(cfg, routes.hostnames, depends_on = (
+        *(( gw.gw, dns_cache.service ) if layer == "all" else ()),
+        *(resource for svc in services for resource in (svc.deployment, svc.route)),
+    ))
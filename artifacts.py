@@ -0,0 +1,195 @@
+"""Content-addressed local cache of the Helm charts and manifests the program installs.
+
+Artifacts are stored under `.artifacts/<sha256>/`, and their digests are pinned, by name and
+version, in `artifacts.lock.json`: artifacts which aren't pinned are refused.
+The lock file isn't part of the repository yet: bootstrap it with `pin` before the first
+`pulumi preview`, which then trusts the artifacts downloaded at that time.
+After adding or updating an artifact, `pin` records its digest too; review digests,
+e.g. against those their upstreams publish, before committing the lock file.
+
+With `ARTIFACTS_OFFLINE` set in the environment, nothing is fetched: the program then only
+uses (verified) cached artifacts, and fails if any is missing.
+
+Usage: `python artifacts.py {fetch,verify,pin}`
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess  # noqa: S404
+import tempfile
+import urllib.request
+from dataclasses import dataclass
+from pathlib import Path
+
+ROOT = Path(__file__).parent
+CACHE_DIR = ROOT / ".artifacts"
+LOCK = ROOT / "artifacts.lock.json"
+
+log = logging.getLogger("artifacts")
+
+
+@dataclass(frozen = True, slots = True)
+class Artifact:
+    """A versioned file, fetched from an HTTP(S) URL or an OCI Helm chart repository."""
+
+    name: str
+    version: str
+    url: str
+
+    @property
+    def key(self) -> str:
+        """Name and version, as recorded in the lock file."""
+        return f"{self.name}@{self.version}"
+
+    @property
+    def filename(self) -> str:
+        """Name of the file within its cache directory."""
+        if self.url.startswith("oci://"):
+            return f"{self.name}-{self.version}.tgz"
+        return self.url.rsplit("/", 1)[-1]
+
+
+CILIUM_CHART = Artifact("cilium", "1.17.2", "https://helm.cilium.io/cilium-1.17.2.tgz")
+GATEWAY_API_CRDS = Artifact(
+    "gateway-api-crds", "1.2.0",
+    "https://github.com/kubernetes-sigs/gateway-api/releases/download/v1.2.0/standard-install.yaml",
+)
+GATEWAY_API_TLSROUTE_CRD = Artifact(
+    "gateway-api-tlsroute-crd", "1.2.0",
+    "https://raw.githubusercontent.com/kubernetes-sigs/gateway-api/v1.2.0/"
+    "config/crd/experimental/gateway.networking.k8s.io_tlsroutes.yaml",
+)
+METRICS_SERVER_CHART = Artifact(
+    "metrics-server", "3.12.2",
+    "https://github.com/kubernetes-sigs/metrics-server/releases/download/"
+    "metrics-server-helm-chart-3.12.2/metrics-server-3.12.2.tgz",
+)
+NGINX_GATEWAY_FABRIC_CHART = Artifact(
+    "nginx-gateway-fabric", "1.6.2",
+    "oci://ghcr.io/nginx/charts/nginx-gateway-fabric",
+)
+
+ALL = (
+    CILIUM_CHART,
+    GATEWAY_API_CRDS,
+    GATEWAY_API_TLSROUTE_CRD,
+    METRICS_SERVER_CHART,
+    NGINX_GATEWAY_FABRIC_CHART,
+)
+
+
+class ArtifactError(Exception):
+    """An artifact is missing from the cache, or doesn't match its pinned digest."""
+
+
+def _sha256(file: Path) -> str:
+    digest = hashlib.sha256()
+    with file.open("rb") as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _lock() -> dict[str, str]:
+    return json.loads(LOCK.read_text(encoding = "utf-8")) if LOCK.exists() else {}
+
+
+def _download(artifact: Artifact, destination: Path) -> Path:
+    if artifact.url.startswith("oci://"):
+        subprocess.run(  # noqa: S603
+            ( "helm", "pull", artifact.url, "--version", artifact.version,  # noqa: S607
+              "--destination", str(destination) ),
+            check = True, capture_output = True,
+        )
+    else:
+        with (
+            urllib.request.urlopen(artifact.url, timeout = 60) as response,  # noqa: S310
+            (destination / artifact.filename).open("wb") as f,
+        ):
+            shutil.copyfileobj(response, f)
+
+    return destination / artifact.filename
+
+
+def fetch(artifact: Artifact, *, pin: bool = False) -> Path:
+    """Download an artifact into the cache, verifying it against its pinned digest.
+
+    With `pin`, the digest of an artifact which isn't pinned yet is recorded in the lock file.
+
+    Raises:
+        ArtifactError: if the artifact isn't pinned, e.g. as there is no lock file yet,
+            or the download doesn't match its digest.
+
+    """
+    lock = _lock()
+    if not LOCK.exists() and not pin:
+        msg = f"{LOCK.name} doesn't exist, bootstrap it with `python artifacts.py pin`"
+        raise ArtifactError(msg)
+    if artifact.key not in lock and not pin:
+        msg = f"{artifact.key} has no pinned digest, see `python artifacts.py pin`"
+        raise ArtifactError(msg)
+
+    CACHE_DIR.mkdir(exist_ok = True)
+    with tempfile.TemporaryDirectory(dir = CACHE_DIR) as tmp:
+        downloaded = _download(artifact, Path(tmp))
+        digest = _sha256(downloaded)
+
+        if lock.setdefault(artifact.key, digest) != digest:
+            msg = f"{artifact.key} has digest {digest}, expected {lock[artifact.key]}"
+            raise ArtifactError(msg)
+
+        cached = CACHE_DIR / digest / artifact.filename
+        cached.parent.mkdir(parents = True, exist_ok = True)
+        downloaded.replace(cached)
+
+    if pin:
+        LOCK.write_text(json.dumps(lock, indent = 2, sort_keys = True) + "\n", encoding = "utf-8")
+    return cached
+
+
+def path(artifact: Artifact) -> Path:
+    """Get the path of an artifact in the cache, verifying it and fetching it if needed.
+
+    Raises:
+        ArtifactError: if the artifact isn't cached while offline, or doesn't match its digest.
+
+    """
+    digest = _lock().get(artifact.key)
+    cached = CACHE_DIR / str(digest) / artifact.filename
+    if digest and cached.exists():
+        if _sha256(cached) != digest:
+            msg = f"cached {artifact.key} doesn't match its pinned digest {digest}"
+            raise ArtifactError(msg)
+        return cached
+
+    if os.environ.get("ARTIFACTS_OFFLINE"):
+        msg = f"{artifact.key} isn't cached, run `python artifacts.py fetch` while online"
+        raise ArtifactError(msg)
+
+    log.info("fetching %s", artifact.key)
+    return fetch(artifact)
+
+
+def main() -> None:
+    """Fetch, verify or pin all artifacts."""
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument("command", choices = ( "fetch", "verify", "pin" ))
+    args = parser.parse_args()
+    logging.basicConfig(level = logging.INFO, format = "%(message)s")
+
+    if args.command == "verify":
+        os.environ["ARTIFACTS_OFFLINE"] = "1"
+
+    for artifact in ALL:
+        if args.command == "pin" and artifact.key not in _lock():
+            fetch(artifact, pin = True)
+            log.warning("pinned %s to %s, review it", artifact.key, _lock()[artifact.key])
+        log.info("%s: %s", artifact.key, path(artifact).relative_to(ROOT))
+
+
+if __name__ == "__main__":
+    main()
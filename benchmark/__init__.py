@@ -0,0 +1,4 @@
+# noqa: D104
+from . import dnsperf, fortio
+
+__all__ = ( "dnsperf", "fortio" )
@@ -0,0 +1,173 @@
+"""DNS load generator, resolving names the way pods' stub resolvers do.
+
+Uses only the Python standard library. `CONCURRENCY` workers look names from `QUERIES` up
+against `SERVER` for `DURATION` seconds, each lookup expanding the name through the pod's
+`resolv.conf` search path, until an answer is found, when it has fewer than `ndots` dots.
+
+`QUERIES` lists one `category name` per line; results are summarized by category:
+lookups per second, lookup latency percentiles, DNS queries per lookup and failures.
+For categories whose names are served by the stub upstream, which answers after
+`STUB_DELAY_MS`, lookups answered faster than that are counted as cache hits.
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import random
+import struct
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, cast
+
+SERVER = os.environ.get("SERVER", "10.96.0.53")
+QUERIES = Path(os.environ.get("QUERIES", "/etc/benchmark/queries"))
+OUTPUT = Path(os.environ.get("OUTPUT", "/results/dns.json"))
+CONCURRENCY = int(os.environ.get("CONCURRENCY", "16"))
+DURATION = float(os.environ.get("DURATION", "30"))
+TIMEOUT = float(os.environ.get("TIMEOUT", "1"))
+STUB_CATEGORIES = set(os.environ.get("STUB_CATEGORIES", "external").split())
+STUB_DELAY = int(os.environ.get("STUB_DELAY_MS", "5")) / 1000
+RESOLV_CONF = Path("/etc/resolv.conf")
+
+NOERROR = 0
+
+
+def search_path() -> tuple[list[str], int]:
+    """Read the search domains and `ndots` option from `resolv.conf`."""
+    search, ndots = [], 1
+    for line in RESOLV_CONF.read_text(encoding = "utf-8").splitlines():
+        match line.split():
+            case [ "search", *domains ]:
+                search = domains
+            case [ "options", *options ]:
+                ndots = next(
+                    (int(option[6:]) for option in options if option.startswith("ndots:")),
+                    ndots,
+                )
+    return search, ndots
+
+
+def candidates(name: str, search: list[str], ndots: int) -> list[str]:
+    """List the absolute names a stub resolver tries, in order, to look `name` up."""
+    if name.endswith("."):
+        return [ name ]
+    expanded = [ f"{name}.{domain}." for domain in search ]
+    return [ *expanded, f"{name}." ] if name.count(".") < ndots else [ f"{name}.", *expanded ]
+
+
+def query(ident: int, name: str) -> bytes:
+    """Encode an `A` query, with recursion desired."""
+    labels = b"".join(
+        bytes((len(label),)) + label.encode() for label in name.rstrip(".").split(".")
+    )
+    return struct.pack("!HHHHHH", ident, 0x0100, 1, 0, 0, 0) + labels + b"\0\0\1\0\1"
+
+
+class Client(asyncio.DatagramProtocol):
+    """Send queries over one UDP socket, matching responses to them by ID."""
+
+    transport: asyncio.DatagramTransport
+
+    def __init__(self) -> None:
+        """Start without pending queries, using query IDs in random order."""
+        self.pending: dict[int, asyncio.Future[tuple[int, int]]] = {}
+        self.ids = itertools.cycle(random.sample(range(1 << 16), 1 << 16))
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        """Keep the transport, to send queries on it."""
+        self.transport = cast("asyncio.DatagramTransport", transport)
+
+    def datagram_received(self, data: bytes, _addr: tuple[str, int]) -> None:
+        """Resolve the pending query a response answers, with its rcode and answer count."""
+        ident, flags, _, ancount = struct.unpack("!HHHH", data[:8])
+        if (future := self.pending.pop(ident, None)) and not future.done():
+            future.set_result((flags & 0xF, ancount))
+
+    async def resolve(self, name: str) -> tuple[int, int]:
+        """Send a query, and wait up to `TIMEOUT` for its rcode and answer count."""
+        ident = next(self.ids)
+        future = self.pending[ident] = asyncio.get_running_loop().create_future()
+        self.transport.sendto(query(ident, name))
+        try:
+            return await asyncio.wait_for(future, TIMEOUT)
+        finally:
+            self.pending.pop(ident, None)
+
+
+async def worker(
+    names: list[tuple[str, str]],
+    deadline: float,
+    stats: dict[str, dict[str, Any]],
+) -> None:
+    """Look random names up until the deadline, recording each lookup's outcome."""
+    search, ndots = search_path()
+    _, client = await asyncio.get_running_loop().create_datagram_endpoint(
+        Client, remote_addr = (SERVER, 53),
+    )
+    while time.monotonic() < deadline:
+        category, name = random.choice(names)  # noqa: S311
+        category_stats = stats[category]
+        start = time.perf_counter()
+        for candidate in candidates(name, search, ndots):
+            category_stats["queries"] += 1
+            sent = time.perf_counter()
+            try:
+                rcode, answers = await client.resolve(candidate)
+            except TimeoutError:
+                category_stats["timeouts"] += 1
+                break
+            if rcode == NOERROR and answers:
+                # the stub answers slower than this, so the resolver's cache did
+                category_stats["hits"] += time.perf_counter() - sent < STUB_DELAY
+                break
+        else:
+            category_stats["failures"] += 1
+        category_stats["latencies"].append(time.perf_counter() - start)
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Compute the `p`-th percentile of sorted values, in milliseconds."""
+    return round(values[min(len(values) - 1, int(len(values) * p / 100))] * 1000, 3)
+
+
+def summarize(stats: dict[str, dict[str, Any]]) -> dict[str, Any]:
+    """Reduce the recorded lookups to rates, percentiles and ratios, by category."""
+    summary = {}
+    for category, category_stats in sorted(stats.items()):
+        latencies = sorted(category_stats["latencies"])
+        lookups = len(latencies)
+        summary[category] = {
+            "lookups_per_second": round(lookups / DURATION, 1),
+            **{ f"p{p}_ms": percentile(latencies, p) for p in ( 50, 95, 99 ) },
+            "queries_per_lookup": round(category_stats["queries"] / lookups, 2),
+            "failures": category_stats["failures"],
+            "timeouts": category_stats["timeouts"],
+        } | ({
+            "cache_hit_ratio": round(category_stats["hits"] / lookups, 3),
+        } if category in STUB_CATEGORIES else {})
+    summary["total"] = {
+        "queries_per_second": round(sum(s["queries"] for s in stats.values()) / DURATION, 1),
+    }
+    return summary
+
+
+async def main() -> None:
+    """Run the workers, and write their summarized results to `OUTPUT`."""
+    names = [
+        (category, name)
+        for line in QUERIES.read_text(encoding = "utf-8").splitlines()
+        if line.strip() and not line.startswith("#")
+        for category, name in [ line.split() ]
+    ]
+    stats: dict[str, dict[str, Any]] = defaultdict(lambda: {
+        "queries": 0, "failures": 0, "timeouts": 0, "hits": 0, "latencies": [],
+    })
+    deadline = time.monotonic() + DURATION
+    await asyncio.gather(*(worker(names, deadline, stats) for _ in range(CONCURRENCY)))
+    OUTPUT.write_text(json.dumps(summarize(stats), indent = 2), encoding = "utf-8")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
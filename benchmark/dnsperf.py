@@ -0,0 +1,293 @@
+"""Benchmark DNS resolution from pods, through the node-local cache and directly to kube-dns.
+
+A load generator on each node looks names up the way pods' stub resolvers do, expanding
+them through the `ndots:5` search path, with a mix of:
+- `cluster`: fully-qualified `cluster.local` names ;
+- `search`: short Service names, as commonly used by applications ;
+- `external`: names in :py:data:`STUB_ZONE`, served by a local stub upstream.
+
+Both resolvers forward :py:data:`STUB_ZONE` to the stub: the Hickory cache through
+:py:func:`forwards`, and kube-dns through a copy of it, see :py:func:`_coredns`, so the
+cluster's own CoreDNS configuration isn't changed.
+"""
+
+import importlib.resources
+import re
+from collections.abc import Sequence
+from typing import Any
+
+import pulumi
+import pulumi_kubernetes as k8s
+
+import dns
+import images
+from utils import http_get
+
+from . import job
+
+STUB_ZONE = "bench.test"
+STUB_ADDRESS = "10.96.0.54"
+"""Cluster IP of the stub upstream, fixed so the DNS cache's configuration can refer to it."""
+STUB_DELAY_MS = 5
+"""Delay of the stub's answers, modelling an Internet resolver's round-trip time."""
+DURATION_UNITS = { "ms": 0.001, "s": 1, "m": 60, "h": 3600 }
+DURATION_SEGMENT = re.compile(r"(\d+(?:\.\d*)?|\.\d+)(ms|s|m|h)")
+DURATION_FORMAT = re.compile(f"(?:{DURATION_SEGMENT.pattern})+")
+KUBE_DNS_ADDRESS = "10.96.0.55"
+"""Cluster IP of the copy of kube-dns, which also forwards :py:data:`STUB_ZONE` to the stub."""
+
+QUERIES = "\n".join((
+    "cluster kubernetes.default.svc.cluster.local.",
+    "cluster kube-dns.kube-system.svc.cluster.local.",
+    "search kubernetes.default",
+    "search kube-dns.kube-system",
+    # a few hundred names, so the cache sees both hits and misses
+    *(f"external host-{i}.{STUB_ZONE}" for i in range(256)),
+)) + "\n"
+
+RESOLVERS = {
+    "hickory": dns.cache.HICKORY_ADDRESS,
+    "kube-dns": KUBE_DNS_ADDRESS,
+}
+
+
+def forwards() -> dict[str, list[dns.cache.Upstream]]:
+    """Forward zones to configure the DNS cache with, for `external` names to reach the stub."""
+    return { STUB_ZONE: [ dns.cache.Upstream(STUB_ADDRESS) ] }
+
+
+def deploy(
+    cfg: pulumi.Config, *,
+    depends_on: Sequence[pulumi.Input[pulumi.Resource]] = (),
+) -> pulumi.Output[dict[str, Any]]:
+    """Load both resolvers in turn from `benchmarkNodes` nodes, for `benchmarkDuration` each.
+
+    Returns lookup rates, latency percentiles and, for `external` names, the cache hit ratio,
+    by node and resolver; also published in the `dns-benchmark-results` ConfigMap,
+    and exported as `benchmark-dns`.
+    The benchmark is re-run whenever its parameters, `dns.cache`, or its configuration change.
+    """
+    concurrency = cfg.get_int("benchmarkConcurrency") or 16
+    duration = cfg.get("benchmarkDuration") or "30s"
+    stub = _stub()
+    coredns = _coredns()
+
+    results = job.run(
+        "dns-benchmark",
+        [
+            k8s.core.v1.ContainerArgs(
+                name = f"load-{resolver}",
+                image = images.PYTHON,
+                image_pull_policy = "IfNotPresent",
+                args = [ "python", f"{job.FILES}/dnsload.py" ],
+                env = [
+                    k8s.core.v1.EnvVarArgs(name = key, value = value)
+                    for key, value in {
+                        "SERVER": address,
+                        "QUERIES": f"{job.FILES}/queries",
+                        "OUTPUT": f"{job.RESULTS}/{resolver}.json",
+                        "CONCURRENCY": str(concurrency),
+                        "DURATION": str(_seconds(duration)),
+                        "STUB_DELAY_MS": str(STUB_DELAY_MS),
+                    }.items()
+                ],
+            )
+            for resolver, address in RESOLVERS.items()
+        ],
+        result_format = "json",
+        revision = job.revision(dns.cache, **{
+            key: cfg.get(key)
+            for key in ( "dnsCache", "dnsNodeLocal", "upstreamDns", "upstreamConcurrency" )
+        }),
+        pods = cfg.get_int("benchmarkNodes") or 2,
+        files = {
+            "dnsload.py": (importlib.resources.files(__package__) / "dnsload.py").read_text(),
+            "queries": QUERIES,
+        },
+        depends_on = [ stub, coredns, *depends_on ],
+    )
+    pulumi.export("benchmark-dns", results)
+    return results
+
+
+def _seconds(duration: str) -> float:
+    """Convert a Go-style duration, e.g. `30s`, `2m` or `1m30s`, to seconds.
+
+    Raises:
+        ValueError: if the duration isn't a sequence of numbers with units from `ms` to `h`.
+
+    """
+    if not DURATION_FORMAT.fullmatch(duration):
+        msg = f"unsupported duration {duration!r}, expected e.g. 30s, 2m or 1m30s"
+        raise ValueError(msg)
+    return sum(
+        float(number) * DURATION_UNITS[unit] for number, unit in DURATION_SEGMENT.findall(duration)
+    )
+
+
+def _coredns() -> k8s.core.v1.Service:
+    """Deploy a copy of `kube-dns`, i.e. CoreDNS, which also forwards :py:data:`STUB_ZONE`.
+
+    The cluster's own CoreDNS isn't changed. The copy runs the same image, with kind's Corefile
+    (`Corefile`) plus a server block for the stub, and the permissions kubeadm gives CoreDNS.
+    """
+    ns = job.namespace()
+    labels = { "app": "dns-kube-dns" }
+    meta = k8s.meta.v1.ObjectMetaArgs(namespace = ns.metadata.name, labels = labels)
+
+    account = k8s.core.v1.ServiceAccount("dns-kube-dns", metadata = meta)
+    k8s.rbac.v1.ClusterRoleBinding(
+        "benchmark-kube-dns",
+        role_ref = k8s.rbac.v1.RoleRefArgs(
+            api_group = "rbac.authorization.k8s.io",
+            kind = "ClusterRole",
+            name = "system:coredns",
+        ),
+        subjects = [ k8s.rbac.v1.SubjectArgs(
+            kind = "ServiceAccount",
+            name = account.metadata.name,
+            namespace = ns.metadata.name,
+        ) ],
+    )
+    config = k8s.core.v1.ConfigMap(
+        "dns-kube-dns",
+        metadata = meta,
+        data = { "Corefile": (
+            importlib.resources.files(__package__) / "Corefile"
+        ).read_text() + "\n".join((
+            f"{STUB_ZONE}:53 {{",
+            "    errors",
+            # as kind's Corefile caches other names
+            "    cache 30",
+            f"    forward . {STUB_ADDRESS}",
+            "}",
+        )) + "\n" },
+    )
+    deployment = k8s.apps.v1.Deployment(
+        "dns-kube-dns",
+        metadata = meta,
+        spec = k8s.apps.v1.DeploymentSpecArgs(
+            replicas = 2,  # as kube-dns
+            selector = k8s.meta.v1.LabelSelectorArgs(match_labels = labels),
+            template = k8s.core.v1.PodTemplateSpecArgs(
+                metadata = k8s.meta.v1.ObjectMetaArgs(labels = labels),
+                spec = k8s.core.v1.PodSpecArgs(
+                    service_account_name = account.metadata.name,
+                    # forward other names to the node's resolver, as kube-dns does
+                    dns_policy = "Default",
+                    containers = [ k8s.core.v1.ContainerArgs(
+                        name = "coredns",
+                        image = images.COREDNS,
+                        image_pull_policy = "IfNotPresent",
+                        args = [ "-conf", "/etc/coredns/Corefile" ],
+                        ports = [
+                            k8s.core.v1.ContainerPortArgs(
+                                name = f"dns-{proto.lower()}",
+                                container_port = 53,
+                                protocol = proto,
+                            )
+                            for proto in ( "TCP", "UDP" )
+                        ],
+                        readiness_probe = http_get("/ready", 8181),
+                        volume_mounts = [ k8s.core.v1.VolumeMountArgs(
+                            name = "config",
+                            mount_path = "/etc/coredns",
+                            read_only = True,
+                        ) ],
+                    ) ],
+                    volumes = [ k8s.core.v1.VolumeArgs(
+                        name = "config",
+                        config_map = k8s.core.v1.ConfigMapVolumeSourceArgs(
+                            name = config.metadata.name,
+                        ),
+                    ) ],
+                ),
+            ),
+        ),
+    )
+
+    return k8s.core.v1.Service(
+        "dns-kube-dns",
+        metadata = meta,
+        opts = pulumi.ResourceOptions(depends_on = deployment),
+        spec = k8s.core.v1.ServiceSpecArgs(
+            cluster_ip = KUBE_DNS_ADDRESS,
+            ports = [
+                k8s.core.v1.ServicePortArgs(
+                    name = f"dns-{proto.lower()}",
+                    port = 53,
+                    target_port = f"dns-{proto.lower()}",
+                    protocol = proto,
+                )
+                for proto in ( "TCP", "UDP" )
+            ],
+            selector = labels,
+        ),
+    )
+
+
+def _stub() -> k8s.core.v1.Service:
+    """Deploy the stub upstream, see `stub.py`."""
+    ns = job.namespace()
+    labels = { "app": "dns-stub" }
+    meta = k8s.meta.v1.ObjectMetaArgs(namespace = ns.metadata.name, labels = labels)
+
+    script = k8s.core.v1.ConfigMap(
+        "dns-stub",
+        metadata = meta,
+        data = { "stub.py": (importlib.resources.files(__package__) / "stub.py").read_text() },
+    )
+    deployment = k8s.apps.v1.Deployment(
+        "dns-stub",
+        metadata = meta,
+        spec = k8s.apps.v1.DeploymentSpecArgs(
+            selector = k8s.meta.v1.LabelSelectorArgs(match_labels = labels),
+            template = k8s.core.v1.PodTemplateSpecArgs(
+                metadata = k8s.meta.v1.ObjectMetaArgs(labels = labels),
+                spec = k8s.core.v1.PodSpecArgs(
+                    containers = [ k8s.core.v1.ContainerArgs(
+                        name = "stub",
+                        image = images.PYTHON,
+                        image_pull_policy = "IfNotPresent",
+                        args = [ "python", "/etc/dns-stub/stub.py" ],
+                        env = [ k8s.core.v1.EnvVarArgs(
+                            name = "DELAY_MS",
+                            value = str(STUB_DELAY_MS),
+                        ) ],
+                        ports = [ k8s.core.v1.ContainerPortArgs(
+                            name = "dns-udp",
+                            container_port = 53,
+                            protocol = "UDP",
+                        ) ],
+                        volume_mounts = [ k8s.core.v1.VolumeMountArgs(
+                            name = "script",
+                            mount_path = "/etc/dns-stub",
+                            read_only = True,
+                        ) ],
+                    ) ],
+                    volumes = [ k8s.core.v1.VolumeArgs(
+                        name = "script",
+                        config_map = k8s.core.v1.ConfigMapVolumeSourceArgs(
+                            name = script.metadata.name,
+                        ),
+                    ) ],
+                ),
+            ),
+        ),
+    )
+
+    return k8s.core.v1.Service(
+        "dns-stub",
+        metadata = meta,
+        opts = pulumi.ResourceOptions(depends_on = deployment),
+        spec = k8s.core.v1.ServiceSpecArgs(
+            cluster_ip = STUB_ADDRESS,
+            ports = [ k8s.core.v1.ServicePortArgs(
+                name = "dns-udp",
+                port = 53,
+                target_port = "dns-udp",
+                protocol = "UDP",
+            ) ],
+            selector = labels,
+        ),
+    )
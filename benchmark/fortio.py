@@ -0,0 +1,63 @@
+"""Benchmark the request path through the gateway, with `fortio`.
+
+Each hostname routed by the gateway is loaded in turn, from inside the cluster, so requests
+take the same path as clients': DNS cache → gateway → HTTPRoute → Service → pod.
+"""
+
+from collections.abc import Iterable, Sequence
+from typing import Any
+
+import pulumi
+import pulumi_kubernetes as k8s
+
+import cilium
+import gateway
+import images
+
+from . import job
+
+
+def deploy(
+    cfg: pulumi.Config,
+    hostnames: Iterable[str], *,
+    depends_on: Sequence[pulumi.Input[pulumi.Resource]] = (),
+) -> pulumi.Output[dict[str, Any]]:
+    """Load each hostname for `benchmarkDuration`, with `benchmarkConcurrency` connections.
+
+    Returns throughput, p50/p95/p99 latency and error counts by node and hostname, also
+    published in the `http-benchmark-results` ConfigMap; they are exported as `benchmark-http`.
+    The benchmark is re-run whenever its parameters, `cilium.py` or `gateway.py` change,
+    or the Gateway API implementation or Cilium datapath features they're configured with.
+    """
+    concurrency = cfg.get_int("benchmarkConcurrency") or 16
+    duration = cfg.get("benchmarkDuration") or "30s"
+
+    results = job.run(
+        "http-benchmark",
+        [
+            k8s.core.v1.ContainerArgs(
+                name = f"load-{i}",
+                image = images.FORTIO,
+                image_pull_policy = "IfNotPresent",
+                args = [
+                    "load",
+                    "-c", str(concurrency),
+                    "-qps", "0",  # as fast as responses allow
+                    "-t", duration,
+                    "-p", "50,95,99",
+                    "-json", f"{job.RESULTS}/{hostname}.json",
+                    f"http://{hostname}/",
+                ],
+            )
+            for i, hostname in enumerate(sorted(hostnames))
+        ],
+        result_format = "fortio",
+        revision = job.revision(
+            cilium, gateway,
+            gatewayImplementation = cfg.get("gatewayImplementation"),
+            ciliumDatapath = cfg.get_object("ciliumDatapath"),
+        ),
+        depends_on = depends_on,
+    )
+    pulumi.export("benchmark-http", results)
+    return results
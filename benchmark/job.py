@@ -0,0 +1,194 @@
+"""Run load generators in a Job, and read their summarized results back into the stack.
+
+The load generators run one after the other, as init containers writing to a shared volume,
+so they don't compete for the node's CPU; `publish.py` then summarizes their results into
+a ConfigMap, which is read back once the Job completes.
+
+A Job may run several pods, spread across nodes, each publishing its own results.
+"""
+
+import hashlib
+import importlib.resources
+import json
+from collections.abc import Mapping, Sequence
+from functools import cache
+from pathlib import Path
+from types import ModuleType
+from typing import Any
+
+import pulumi
+import pulumi_kubernetes as k8s
+
+import images
+
+RESULTS = "/results"
+"""Directory shared by the load generators, each writing its results to a file."""
+FILES = "/etc/benchmark"
+"""Directory holding `publish.py`, and the files passed to :py:func:`run`."""
+
+
+@cache
+def namespace() -> k8s.core.v1.Namespace:
+    """Namespace of all benchmarks, and of the service account publishing their results.
+
+    Singleton, can be called by each benchmark.
+    """
+    ns = k8s.core.v1.Namespace("benchmark")
+    meta = k8s.meta.v1.ObjectMetaArgs(name = "benchmark", namespace = ns.metadata.name)
+
+    account = k8s.core.v1.ServiceAccount("benchmark", metadata = meta)
+    role = k8s.rbac.v1.Role(
+        "benchmark",
+        metadata = meta,
+        rules = [ k8s.rbac.v1.PolicyRuleArgs(
+            api_groups = [ "" ],
+            resources = [ "configmaps" ],
+            verbs = [ "get", "create", "patch" ],
+        ) ],
+    )
+    k8s.rbac.v1.RoleBinding(
+        "benchmark",
+        metadata = meta,
+        role_ref = k8s.rbac.v1.RoleRefArgs(
+            api_group = "rbac.authorization.k8s.io",
+            kind = "Role",
+            name = role.metadata.name,
+        ),
+        subjects = [ k8s.rbac.v1.SubjectArgs(
+            kind = "ServiceAccount",
+            name = account.metadata.name,
+            namespace = ns.metadata.name,
+        ) ],
+    )
+
+    return ns
+
+
+def revision(*modules: ModuleType, **config: Any) -> str:  # noqa: ANN401
+    """Digest the source of the modules a benchmark measures, and the `config` they're set up with.
+
+    Passed to the Job, so it is re-run whenever either changes.
+    `config` values must be JSON-serializable, e.g. as read from the Pulumi configuration.
+    """
+    digest = hashlib.sha256()
+    for module in modules:
+        digest.update(Path(str(module.__file__)).read_bytes())
+    digest.update(json.dumps(config, sort_keys = True).encode())
+    return digest.hexdigest()[:16]
+
+
+def run(  # noqa: PLR0913
+    name: str,
+    load: Sequence[k8s.core.v1.ContainerArgs], *,
+    result_format: str,
+    revision: str,
+    pods: int = 1,
+    files: Mapping[str, str] | None = None,
+    depends_on: Sequence[pulumi.Input[pulumi.Resource]] = (),
+) -> pulumi.Output[dict[str, Any]]:
+    """Run load generators in `pods` pods, on different nodes, and return results by node.
+
+    Each container in `load` should write its results, in `result_format`, to a file
+    in :py:data:`RESULTS` named after its target; see `publish.py`.
+    `files`, e.g. scripts or query lists, are available to them in :py:data:`FILES`.
+    """
+    ns = namespace()
+    meta = k8s.meta.v1.ObjectMetaArgs(namespace = ns.metadata.name, labels = { "app": name })
+    results = f"{name}-results"
+
+    files_configmap = k8s.core.v1.ConfigMap(
+        f"{name}-files",
+        metadata = meta,
+        data = {
+            "publish.py": (importlib.resources.files(__package__) / "publish.py").read_text(),
+        } | dict(files or {}),
+    )
+    mounts = [
+        k8s.core.v1.VolumeMountArgs(name = "results", mount_path = RESULTS),
+        k8s.core.v1.VolumeMountArgs(name = "files", mount_path = FILES, read_only = True),
+    ]
+
+    job = k8s.batch.v1.Job(
+        name,
+        metadata = meta,
+        opts = pulumi.ResourceOptions(depends_on = depends_on),
+        spec = k8s.batch.v1.JobSpecArgs(
+            backoff_limit = 0,  # a retried run would measure a different situation
+            completion_mode = "Indexed",
+            completions = pods,
+            parallelism = pods,
+            template = k8s.core.v1.PodTemplateSpecArgs(
+                metadata = k8s.meta.v1.ObjectMetaArgs(labels = meta.labels),
+                spec = k8s.core.v1.PodSpecArgs(
+                    restart_policy = "Never",
+                    service_account_name = "benchmark",
+                    # one pod per node, control-plane included
+                    tolerations = [ k8s.core.v1.TolerationArgs(
+                        key = "node-role.kubernetes.io/control-plane",
+                        operator = "Exists",
+                        effect = "NoSchedule",
+                    ) ],
+                    topology_spread_constraints = [
+                        k8s.core.v1.TopologySpreadConstraintArgs(
+                            label_selector = k8s.meta.v1.LabelSelectorArgs(
+                                match_labels = meta.labels,
+                            ),
+                            topology_key = "kubernetes.io/hostname",
+                            max_skew = 1,
+                            when_unsatisfiable = "DoNotSchedule",
+                        ),
+                    ],
+                    init_containers = [
+                        k8s.core.v1.ContainerArgs(**vars(container) | {
+                            "volume_mounts": mounts,
+                        }) for container in load
+                    ],
+                    containers = [ k8s.core.v1.ContainerArgs(
+                        name = "publish",
+                        image = images.PYTHON,
+                        image_pull_policy = "IfNotPresent",
+                        args = [ "python", f"{FILES}/publish.py" ],
+                        env = [
+                            k8s.core.v1.EnvVarArgs(name = key, value = value)
+                            for key, value in {
+                                "RESULTS": RESULTS,
+                                "FORMAT": result_format,
+                                "CONFIGMAP": results,
+                                "REVISION": revision,
+                            }.items()
+                        ] + [ k8s.core.v1.EnvVarArgs(
+                            name = "NODE_NAME",
+                            value_from = k8s.core.v1.EnvVarSourceArgs(
+                                field_ref = k8s.core.v1.ObjectFieldSelectorArgs(
+                                    field_path = "spec.nodeName",
+                                ),
+                            ),
+                        ) ],
+                        volume_mounts = mounts,
+                    ) ],
+                    volumes = [
+                        k8s.core.v1.VolumeArgs(
+                            name = "results",
+                            empty_dir = k8s.core.v1.EmptyDirVolumeSourceArgs(),
+                        ),
+                        k8s.core.v1.VolumeArgs(
+                            name = "files",
+                            config_map = k8s.core.v1.ConfigMapVolumeSourceArgs(
+                                name = files_configmap.metadata.name,
+                            ),
+                        ),
+                    ],
+                ),
+            ),
+        ),
+    )
+
+    # created by `publish.py` once the Job, which Pulumi waits for, is done
+    published = k8s.core.v1.ConfigMap.get(
+        results,
+        pulumi.Output.concat(ns.metadata.name, "/", results),
+        opts = pulumi.ResourceOptions(depends_on = job),
+    )
+    return published.data.apply(lambda data: {
+        key.removesuffix(".json"): json.loads(value) for key, value in (data or {}).items()
+    })
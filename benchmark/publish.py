@@ -0,0 +1,109 @@
+"""Summarize load generators' results, and publish them to a ConfigMap.
+
+Runs after the load generators, in the same pod, using only the Python standard library:
+each file in `RESULTS` is parsed according to `FORMAT`, and the summaries are written,
+by file name, as `<node>.json` in the ConfigMap `CONFIGMAP` of the pod's namespace;
+pods running on different nodes thus publish side by side.
+"""
+
+import functools
+import json
+import logging
+import os
+import ssl
+import urllib.error
+import urllib.request
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+RESULTS = Path(os.environ.get("RESULTS", "/results"))
+FORMAT = os.environ.get("FORMAT", "fortio")
+CONFIGMAP = os.environ.get("CONFIGMAP", "benchmark-results")
+REVISION = os.environ.get("REVISION", "")
+NODE_NAME = os.environ.get("NODE_NAME", "results")
+ACCOUNT = Path("/var/run/secrets/kubernetes.io/serviceaccount")
+API = "https://kubernetes.default.svc"
+
+log = logging.getLogger("publish")
+
+
+def fortio(path: Path) -> dict[str, Any]:
+    """Summarize `fortio load -json` output: throughput, latency percentiles and errors."""
+    result = json.loads(path.read_text(encoding = "utf-8"))
+    histogram = result["DurationHistogram"]
+    return {
+        "target": result["URL"],
+        "qps": round(result["ActualQPS"], 1),
+        **{
+            f"p{percentile['Percentile']:g}_ms": round(percentile["Value"] * 1000, 3)
+            for percentile in histogram["Percentiles"]
+        },
+        "requests": histogram["Count"],
+        "errors": histogram["Count"] - result["RetCodes"].get("200", 0),
+    }
+
+
+PARSERS: dict[str, Callable[[Path], dict[str, Any]]] = {
+    "fortio": fortio,
+    "json": lambda path: json.loads(path.read_text(encoding = "utf-8")),  # already summarized
+}
+
+
+def request(
+    method: str, path: str, body: dict[str, Any],
+    content_type: str = "application/json",
+) -> None:
+    """Call the Kubernetes API with the pod's service account."""
+    token = (ACCOUNT / "token").read_text(encoding = "utf-8")
+    req = urllib.request.Request(  # noqa: S310
+        API + path, method = method,
+        data = json.dumps(body).encode(),
+        headers = { "Authorization": f"Bearer {token}", "Content-Type": content_type },
+    )
+    context = ssl.create_default_context(cafile = ACCOUNT / "ca.crt")
+    with urllib.request.urlopen(req, context = context, timeout = 30):  # noqa: S310
+        pass
+
+
+def main() -> None:
+    """Publish the summarized results, replacing those of a previous run on the same node.
+
+    Raises:
+        HTTPError: if the Kubernetes API rejects the ConfigMap.
+
+    """
+    logging.basicConfig(level = logging.INFO)
+    summary = {
+        path.stem: PARSERS[FORMAT](path) for path in sorted(RESULTS.iterdir()) if path.is_file()
+    }
+    log.info("%s", json.dumps(summary, indent = 2))
+
+    namespace = (ACCOUNT / "namespace").read_text(encoding = "utf-8")
+    collection = f"/api/v1/namespaces/{namespace}/configmaps"
+    configmap = {
+        "apiVersion": "v1",
+        "kind": "ConfigMap",
+        "metadata": { "name": CONFIGMAP, "annotations": { "benchmark/revision": REVISION } },
+        "data": { f"{NODE_NAME}.json": json.dumps(summary, indent = 2, sort_keys = True) },
+    }
+    # merge into the ConfigMap, creating it if needed
+    patch = functools.partial(
+        request, "PATCH", f"{collection}/{CONFIGMAP}", configmap,
+        content_type = "application/merge-patch+json",
+    )
+    try:
+        patch()
+    except urllib.error.HTTPError as e:
+        if e.code != 404:  # noqa: PLR2004
+            raise
+        try:
+            request("POST", collection, configmap)
+        except urllib.error.HTTPError as e:
+            if e.code != 409:  # noqa: PLR2004
+                raise
+            patch()  # created by another pod in the meantime
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Stub upstream DNS server, answering any `A` query with `ADDRESS` after `DELAY_MS`.
+
+Stands in for an Internet resolver during DNS benchmarks, so results don't depend on
+the network; the delay models its round-trip time. Uses only the Python standard library.
+"""
+
+import asyncio
+import logging
+import os
+import struct
+
+ADDRESS = bytes(map(int, os.environ.get("ADDRESS", "192.0.2.1").split(".")))
+DELAY = int(os.environ.get("DELAY_MS", "5")) / 1000
+TTL = int(os.environ.get("TTL", "300"))
+
+log = logging.getLogger("stub")
+
+
+def answer(query: bytes) -> bytes:
+    """Answer a query, echoing its question; only `A` queries get an answer record."""
+    (ident, _, qdcount), question = struct.unpack("!HHH", query[:6]), query[12:]
+    end = question.index(b"\0") + 5  # name, type and class
+    qtype = struct.unpack("!H", question[end - 4:end - 2])[0]
+    ancount = 1 if qtype == 1 and qdcount == 1 else 0
+    # response, authoritative, recursion desired & available
+    header = struct.pack("!HHHHHH", ident, 0x8580, 1, ancount, 0, 0)
+    record = struct.pack("!HHHIH", 0xC00C, 1, 1, TTL, 4) + ADDRESS if ancount else b""
+    return header + question[:end] + record
+
+
+class Stub(asyncio.DatagramProtocol):
+    """Answer each datagram after the configured delay."""
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        """Keep the transport, to answer on it."""
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr: tuple[str, int]) -> None:
+        """Schedule the answer to a query."""
+        try:
+            response = answer(data)
+        except (struct.error, ValueError):
+            log.warning("malformed query from %s", addr)
+            return
+        asyncio.get_running_loop().call_later(DELAY, self.transport.sendto, response, addr)
+
+
+async def main() -> None:
+    """Serve on UDP port 53 forever."""
+    logging.basicConfig(level = logging.INFO)
+    await asyncio.get_running_loop().create_datagram_endpoint(Stub, local_addr = ("0.0.0.0", 53))
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -6,49 +6,246 @@ Cilium handles basic inter-node networking, service mesh, as well as security fu
 
 Cilium implements as much functionality as possible through eBPF programs executed
 in-kernel, to avoid the overhead of copying data to userspace and switching contexts.
+
+Its datapath can optionally be tuned for throughput and latency; those features depend on
+the nodes' kernel which, with kind, is the one Pulumi runs on.
 """
 
-from collections.abc import Set
-from typing import Literal
+import platform
+import re
+from collections.abc import Mapping, Set
+from typing import Any, Literal, get_args
 
 import pulumi
 import pulumi_kubernetes as k8s
 
-Feature = Literal["hubble"]
+import artifacts
+import gateway
+from component import Component
+from utils import chart_resource
+
+Feature = Literal[
+    "hubble",
+    "local-redirect-policy",
+    "gateway-api",        # implement the Gateway API with the per-node Envoy proxy
+    "metrics",            # Prometheus metrics from the agent, operator, Envoy and Hubble
+    # datapath performance
+    "bandwidth-manager",  # EDT-based rate limiting, and BBR congestion control for pods
+    "bpf-host-routing",   # bypass the host's netfilter, and masquerade in eBPF
+    "native-routing",     # route pod traffic directly between nodes, without tunnelling
+    "netkit",             # netkit devices for pods, rather than veth pairs
+    "big-tcp",            # GRO/GSO of IPv4 packets larger than 64KiB
+    "xdp",                # accelerate NodePort/LoadBalancer services with XDP
+]
+
+POD_SUBNET = "10.244.0.0/16"  # kind's `networking.podSubnet`, set by `cluster.py`
+
+# Hubble flow metrics exported with the `metrics` feature, see
+#  https://docs.cilium.io/en/stable/observability/metrics/#hubble-exported-metrics
+HUBBLE_METRICS = ( "drop", "flow", "icmp", "port-distribution", "tcp" )
+
+# Minimum kernel version required by each feature, as `(major, minor)`
+KERNEL_REQUIREMENTS: Mapping[Feature, tuple[int, int]] = {
+    "bandwidth-manager": (5, 18),  # BBR for pods
+    "bpf-host-routing": (5, 10),
+    "netkit": (6, 8),
+    "big-tcp": (6, 3),  # IPv4 BIG TCP
+    "xdp": (4, 19),
+}
+
+# Other features each feature depends on
+FEATURE_REQUIREMENTS: Mapping[Feature, Set[Feature]] = {
+    # BBR needs packets to keep their socket association up to the host's FQ qdisc
+    "bandwidth-manager": { "bpf-host-routing" },
+    "netkit": { "bpf-host-routing" },
+    # BIG TCP cannot cross tunnels
+    "big-tcp": { "bpf-host-routing", "native-routing" },
+}
+
+
+def kernel_version(release: str | None = None) -> tuple[int, int]:
+    """Parse a kernel release, as reported by `uname -r`, into `(major, minor)`.
+
+    Raises:
+        ValueError: if the release cannot be parsed.
+
+    """
+    release = release or platform.release()
+    if not (match := re.match(r"(\d+)\.(\d+)", release)):
+        msg = f"Cannot parse kernel release '{release}'"
+        raise ValueError(msg)
+    return int(match[1]), int(match[2])
+
+
+def check(features: Set[str], kernel: tuple[int, int] | None = None) -> None:
+    """Reject unknown features, and combinations the kernel or Cilium cannot support.
+
+    The kernel check is skipped if `kernel` isn't given and Pulumi doesn't run on Linux,
+    as kind's nodes then run in a VM whose kernel isn't known.
+
+    Raises:
+        ValueError: if a feature is unknown, misses a dependency, or needs a newer kernel.
+
+    """
+    if unknown := features - set(get_args(Feature)):
+        msg = f"Unknown Cilium features: {', '.join(sorted(unknown))}"
+        raise ValueError(msg)
+
+    for feature in sorted(features):
+        if missing := FEATURE_REQUIREMENTS.get(feature, set()) - features:
+            msg = f"Cilium feature '{feature}' requires {', '.join(sorted(missing))}"
+            raise ValueError(msg)
+
+    if kernel is None:
+        if platform.system() != "Linux":
+            pulumi.log.warn("Not running on Linux, skipping Cilium's kernel requirements check")
+            return
+        kernel = kernel_version()
+
+    for feature in sorted(features):
+        if kernel < (required := KERNEL_REQUIREMENTS.get(feature, (0, 0))):
+            msg = (
+                f"Cilium feature '{feature}' requires kernel "
+                f"{'.'.join(map(str, required))}, found {'.'.join(map(str, kernel))}"
+            )
+            raise ValueError(msg)
+
+
+def values(host: str, port: str, features: Set[Feature] = frozenset()) -> dict[str, Any]:
+    """Render the chart's values, for a given API server endpoint and set of features."""
+    # Reference images by tag, as `preload.py` loads them: nodes only keep the tags
+    #  of images loaded with `kind load`, so images referenced by digest are pulled again
+    by_tag = { "useDigest": False }
+    return {
+        "image": { "pullPolicy": "IfNotPresent", **by_tag },
+        "operator": {
+            "image": by_tag,
+            "replicas": 1,  # No HA, this is a demo cluster
+            "prometheus": { "enabled": "metrics" in features },
+        },
+        "certgen": { "image": by_tag },
+
+        # Expose Prometheus metrics, scraped through the pods' and services' annotations
+        "prometheus": { "enabled": "metrics" in features },
+        "envoy": { "image": by_tag, "prometheus": { "enabled": "metrics" in features } },
+
+        # Avoid `kube-proxy`, let Cilium sling packets around
+        #  requires `kubeProxyMode: "none"` in `kind-config.yaml`
+        "kubeProxyReplacement": True,
+        "k8sServiceHost": host,
+        "k8sServicePort": port,
+
+        # Optionally enable the Hubble observability tool
+        "hubble": {
+            "relay": { "enabled": True, "image": by_tag },
+            "ui": {
+                "enabled": True,
+                "backend": { "image": by_tag },
+                "frontend": { "image": by_tag },
+            },
+            "metrics": { "enabled": list(HUBBLE_METRICS) if "metrics" in features else None },
+        } if "hubble" in features else {},
 
+        # Allow redirecting a Service's traffic to node-local backends
+        "localRedirectPolicy": "local-redirect-policy" in features,
 
-def deploy(cfg: pulumi.Config, *, features: Set[Feature] = frozenset()) -> k8s.helm.v4.Chart:
+        # The GatewayClass is declared by `gateway.deploy`
+        "gatewayAPI": {
+            "enabled": "gateway-api" in features,
+            "gatewayClass": { "create": "false" },
+        },
+
+        # Fair-queue pods' egress traffic, pacing it with BBR
+        "bandwidthManager": {
+            "enabled": "bandwidth-manager" in features,
+            "bbr": "bandwidth-manager" in features,
+        },
+
+        "bpf": {
+            # Route and masquerade in eBPF, rather than through the host's stack and iptables
+            "hostLegacyRouting": "bpf-host-routing" not in features,
+            "masquerade": "bpf-host-routing" in features,
+            "datapathMode": "netkit" if "netkit" in features else "veth",
+        },
+
+        # Route pod traffic as-is between nodes, which share an L2 network with kind
+        #  pods get their addresses from the nodes' `podCIDR`s, allocated out of `POD_SUBNET`
+        #  by Kubernetes, so the native-routing CIDR covers them and they aren't masqueraded
+        "routingMode": "native" if "native-routing" in features else "tunnel",
+        **({
+            "ipam": { "mode": "kubernetes" },
+            "ipv4NativeRoutingCIDR": POD_SUBNET,
+            "autoDirectNodeRoutes": True,
+        } if "native-routing" in features else {}),
+
+        "enableIPv4BIGTCP": "big-tcp" in features,
+
+        # Handle NodePort and LoadBalancer traffic in the NIC driver, before the stack
+        "loadBalancer": {
+            "acceleration": "native" if "xdp" in features else "disabled",
+        },
+    }
+
+
+def _skip_await_hubble(args: pulumi.ResourceTransformArgs) -> pulumi.ResourceTransformResult | None:
+    """Don't wait for Hubble's resources to be ready.
+
+    The chart is a component whose `resources` only resolve once all of them are ready,
+    so :py:attr:`CiliumDeployment.agent` and `operator` would otherwise wait for Hubble.
+    """
+    if not args.name.rpartition("/")[2].startswith("hubble"):
+        return None
+
+    metadata = dict(args.props.get("metadata") or {})
+    metadata["annotations"] = {
+        **(metadata.get("annotations") or {}),
+        "pulumi.com/skipAwait": "true",
+    }
+    return pulumi.ResourceTransformResult({ **args.props, "metadata": metadata }, args.opts)
+
+
+class CiliumDeployment(Component):
+    """Cilium's chart, as a component resource.
+
+    Depending on `agent` or `operator` waits for all of Cilium's resources to be ready,
+    except Hubble's, which the chart doesn't wait for; see :py:func:`utils.chart_resource`.
+    """
+
+    chart: k8s.helm.v4.Chart
+    agent: pulumi.Output[k8s.apps.v1.DaemonSet | None]
+    """Agents' DaemonSet, ready once pod networking works on all nodes."""
+    operator: pulumi.Output[k8s.apps.v1.Deployment | None]
+    """Operator, ready once Cilium's CRDs are installed and IPAM is running."""
+
+
+def deploy(cfg: pulumi.Config, *, features: Set[Feature] = frozenset()) -> CiliumDeployment:
     """Deploy Cilium with a given set of features.
 
     Requires `k8sEndpoint` to be set in the Pulumi configuration;
       possible values can be obtained from `kubectl get endpoints kubernetes`.
+    Features the nodes cannot support are rejected, see :py:func:`check`.
     """
+    check(features)
+
     # address and port of the k8s API server to use
     host, port = cfg.require("k8sEndpoint").rsplit(":", 1)
 
-    return k8s.helm.v4.Chart(
+    component = CiliumDeployment("cilium")
+    chart = k8s.helm.v4.Chart(
         "cilium",
-        chart = "./cilium-1.17.2.tgz",  # FIXME pulumi somehow gets something else from the repo?
-        repository_opts = k8s.helm.v4.RepositoryOptsArgs(
-            repo = "https://helm.cilium.io/",
-        ),
-        version = "1.17.2",  # TODO: autoupdate?
+        chart = str(artifacts.path(artifacts.CILIUM_CHART)),  # TODO: autoupdate?
         namespace = "kube-system",
         # TODO signature verification?
-        values = {
-            "image": { "pullPolicy": "IfNotPresent" },
-            "operator": { "replicas": 1 },  # No HA, this is a demo cluster
-
-            # Avoid `kube-proxy`, let Cilium sling packets around
-            #  requires `kubeProxyMode: "none"` in `kind-config.yaml`
-            "kubeProxyReplacement": True,
-            "k8sServiceHost": host,
-            "k8sServicePort": port,
-
-            # Optionally enable the Hubble observability tool
-            "hubble": {
-                "relay": { "enabled": True },
-                "ui": { "enabled": True },
-            } if "hubble" in features else {},
-        },
+        values = values(host, port, features),
+        # the operator only enables the Gateway API if its CRDs exist when it starts
+        opts = component.child(depends_on = [
+            gateway.crds(), gateway.tls_route_crd(),
+        ] if "gateway-api" in features else [], transforms = [ _skip_await_hubble ]),
+    )
+
+    component.register(
+        chart = chart,
+        agent = chart_resource(chart, k8s.apps.v1.DaemonSet, "cilium"),
+        operator = chart_resource(chart, k8s.apps.v1.Deployment, "cilium-operator"),
     )
+    return component
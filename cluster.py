@@ -0,0 +1,185 @@
+"""Render the kind cluster's configuration, and tune its nodes.
+
+`kind-config.yaml`, and the `registry.d` it mounts as `containerd`'s registry configuration,
+are rendered from the program's own constants: the DNS cache's address, the OCI cache's URL,
+and the pod subnet Cilium routes natively. Re-render them rather than editing them, e.g. with
+`--workers 8` for load runs; the committed files are rendered with the defaults.
+
+kind cannot set sysctls: `sysctl` sets them on a running cluster's nodes. Namespaced ones,
+e.g. `net.core.somaxconn`, only apply to the nodes' network namespaces; others,
+e.g. `fs.inotify.max_user_watches`, are set on the host's kernel, which the nodes share.
+
+Usage:
+  `python cluster.py render [--workers N] [--parallel-pulls N] [--kubelet KEY=VALUE ...]`
+  `python cluster.py sysctl [--name CLUSTER] KEY=VALUE ...`
+"""
+
+import argparse
+import logging
+import subprocess  # noqa: S404
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any
+
+import tomlkit
+import yaml
+
+import cilium
+import dns
+import oci_cache
+
+ROOT = Path(__file__).parent
+KIND_CONFIG = ROOT / "kind-config.yaml"
+REGISTRY_DIR = ROOT / "registry.d"
+OCI_CACHE_DIR = ROOT / "oci-cache.d"
+
+log = logging.getLogger("cluster")
+
+
+class _Dumper(yaml.SafeDumper):
+    """Dump YAML without anchors, and multi-line strings as literal blocks."""
+
+    def ignore_aliases(self, data: Any) -> bool:  # noqa: ANN401, ARG002, PLR6301
+        return True
+
+
+_Dumper.add_representer(str, lambda dumper, data: dumper.represent_scalar(
+    "tag:yaml.org,2002:str", data, style = "|" if "\n" in data else None,
+))
+
+
+def kind_config(
+    workers: int = 1,
+    parallel_pulls: int = 8,
+    kubelet: Mapping[str, Any] | None = None,
+) -> dict[str, Any]:
+    """Render the configuration of a kind cluster, with a control-plane and `workers` nodes.
+
+    Nodes pull images `parallel_pulls` at a time, or one at a time if it is 1.
+    `kubelet` settings are added to the kubelets' `KubeletConfiguration`.
+    """
+    mounts = (
+        ( REGISTRY_DIR, "/etc/containerd/registry.d" ),
+        # OCI cache storage, when `ociCachePersistence` is set to `host`
+        ( OCI_CACHE_DIR, oci_cache.HOST_PATH ),
+    )
+    kubelet_config = {
+        "apiVersion": "kubelet.config.k8s.io/v1beta1",
+        "kind": "KubeletConfiguration",
+        "serializeImagePulls": parallel_pulls <= 1,
+        **({ "maxParallelImagePulls": parallel_pulls } if parallel_pulls > 1 else {}),
+        # hand out the node-local DNS cache to pods, see `dns.cache`
+        "clusterDNS": [ dns.cache.HICKORY_ADDRESS ],
+        **(kubelet or {}),
+    }
+
+    return {
+        "kind": "Cluster",
+        "apiVersion": "kind.x-k8s.io/v1alpha4",
+        "nodes": [
+            {
+                "role": role,
+                "extraMounts": [
+                    { "hostPath": f"./{host.relative_to(ROOT)}", "containerPath": path }
+                    for host, path in mounts
+                ],
+            }
+            for role in ( "control-plane", *(( "worker", ) * workers) )
+        ],
+        "networking": {
+            # Cilium replaces both, see `cilium.values`
+            "disableDefaultCNI": True,
+            "kubeProxyMode": "none",
+            "podSubnet": cilium.POD_SUBNET,
+        },
+        "containerdConfigPatches": [ "\n".join((
+            f"# Path mounted from `{REGISTRY_DIR.name}`, whose `_default/hosts.toml`"
+            " points to the cluster-local pull-through cache",
+            '[plugins."io.containerd.grpc.v1.cri".registry]',
+            '  config_path = "/etc/containerd/registry.d"',
+        )) ],
+        "kubeadmConfigPatches": [ yaml.dump(kubelet_config, Dumper = _Dumper, sort_keys = False) ],
+    }
+
+
+def hosts_toml() -> str:
+    """Render `containerd`'s default registry host configuration, pulling through the OCI cache."""
+    return tomlkit.dumps({ "host": { oci_cache.URL: {
+        "capabilities": [ "pull", "resolve" ],
+        "skip_verify": True,
+    } } })
+
+
+def render(**kwargs: Any) -> dict[Path, str]:  # noqa: ANN401
+    """Render the cluster's configuration files, by path; see :py:func:`kind_config`."""
+    return {
+        KIND_CONFIG: "# Rendered by `python cluster.py render`, don't edit\n"
+        + yaml.dump(kind_config(**kwargs), Dumper = _Dumper, sort_keys = False),
+        REGISTRY_DIR / "_default" / "hosts.toml": hosts_toml(),
+    }
+
+
+def _setting(text: str) -> tuple[str, Any]:
+    """Parse a `KEY=VALUE` argument, the value as YAML.
+
+    Raises:
+        argparse.ArgumentTypeError: if the argument has no `=`.
+
+    """
+    key, sep, value = text.partition("=")
+    if not sep:
+        msg = f"expected KEY=VALUE, got {text!r}"
+        raise argparse.ArgumentTypeError(msg)
+    return key, yaml.safe_load(value)
+
+
+def sysctl(cluster: str, settings: Mapping[str, Any]) -> None:
+    """Set sysctls on all of a kind cluster's nodes."""
+    nodes = subprocess.run(  # noqa: S603
+        ( "kind", "get", "nodes", "--name", cluster ),  # noqa: S607
+        capture_output = True, check = True, text = True,
+    ).stdout.split()
+    for node in nodes:
+        log.info("setting %s on %s", ", ".join(settings), node)
+        subprocess.run(  # noqa: S603
+            ( "docker", "exec", node, "sysctl", "-w",  # noqa: S607
+              *(f"{key}={value}" for key, value in settings.items()) ),
+            capture_output = True, check = True,
+        )
+
+
+def main() -> None:
+    """Render the cluster's configuration files, or tune its nodes' sysctls."""
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest = "command", required = True)
+    render_parser = commands.add_parser("render", help = "render the configuration files")
+    render_parser.add_argument("--workers", type = int, default = 1, help = "number of workers")
+    render_parser.add_argument(
+        "--parallel-pulls", type = int, default = 8, help = "concurrent image pulls per node",
+    )
+    render_parser.add_argument(
+        "--kubelet", type = _setting, action = "append", default = [], metavar = "KEY=VALUE",
+        help = "set a `KubeletConfiguration` field, e.g. maxPods=250",
+    )
+    sysctl_parser = commands.add_parser("sysctl", help = "set sysctls on a cluster's nodes")
+    sysctl_parser.add_argument("--name", default = "kind", help = "name of the kind cluster")
+    sysctl_parser.add_argument("settings", type = _setting, nargs = "+", metavar = "KEY=VALUE")
+    args = parser.parse_args()
+    logging.basicConfig(level = logging.INFO, format = "%(message)s")
+
+    if args.command == "sysctl":
+        sysctl(args.name, dict(args.settings))
+        return
+
+    for path, contents in render(
+        workers = args.workers,
+        parallel_pulls = args.parallel_pulls,
+        kubelet = dict(args.kubelet),
+    ).items():
+        path.parent.mkdir(parents = True, exist_ok = True)
+        path.write_text(contents, encoding = "utf-8")
+        log.info("rendered %s", path.relative_to(ROOT))
+
+
+if __name__ == "__main__":
+    main()
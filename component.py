@@ -0,0 +1,31 @@
+"""Group the resources each of the program's modules deploys, see :py:class:`Component`."""
+
+from typing import Any
+
+import pulumi
+
+
+class Component(pulumi.ComponentResource):
+    """Resources deployed together by one of the program's modules, diffed and shown as a unit.
+
+    Its children are declared with :py:meth:`child`'s options. They are aliased to the
+    top-level resources they were before, so existing stacks don't replace them.
+    """
+
+    def __init__(self, name: str, opts: pulumi.ResourceOptions | None = None) -> None:
+        """Register the component, its type being named after the subclass."""
+        super().__init__(f"pyGraz-k8s:index:{type(self).__name__}", name, None, opts)
+
+    def child(self, **kwargs: Any) -> pulumi.ResourceOptions:  # noqa: ANN401
+        """Build the options of a child resource."""
+        return pulumi.ResourceOptions(
+            parent = self,
+            aliases = [ pulumi.Alias(parent = pulumi.ROOT_STACK_RESOURCE) ],
+            **kwargs,
+        )
+
+    def register(self, **children: Any) -> None:  # noqa: ANN401
+        """Expose notable children and values as attributes, and mark the component complete."""
+        for name, value in children.items():
+            setattr(self, name, value)
+        self.register_outputs({})
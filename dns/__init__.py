@@ -1,4 +1,4 @@
 # noqa: D104
-from . import cache
+from . import cache, zone
 
-__all__ = ( "cache", )
+__all__ = ( "cache", "zone" )
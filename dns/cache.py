@@ -3,31 +3,277 @@
 Uses Hickory DNS as a caching, validating, stub resolver.
 """
 
+import dataclasses
 import importlib.resources
+import ipaddress
+import urllib.parse
+from collections.abc import Mapping, Sequence, Set
+from dataclasses import dataclass
+from typing import Any, Literal
 
 import pulumi
 import pulumi_kubernetes as k8s
 import tomlkit
 
+import images
+from component import Component
+from utils import tcp_socket
 
-def deploy(cfg: pulumi.Config) -> k8s.core.v1.Service:
+
+@dataclass(frozen = True, slots = True)
+class CachePolicy:
+    """Size and TTL bounds (in seconds) of a forward zone's cache.
+
+    Fields left to `None` keep Hickory's defaults.
+    Hickory's resolver has no prefetching nor serve-stale support, so those aren't exposed.
+    """
+
+    cache_size: int | None = None
+    positive_min_ttl: int | None = None
+    positive_max_ttl: int | None = None
+    negative_min_ttl: int | None = None
+    negative_max_ttl: int | None = None
+
+    @classmethod
+    def from_config(cls, obj: Mapping[str, Any]) -> "CachePolicy":
+        """Parse a policy from its Pulumi configuration object, with camelCase keys.
+
+        Raises:
+            ValueError: on unknown settings, or values which aren't non-negative integers.
+
+        """
+        fields = { _camel_case(f.name): f.name for f in dataclasses.fields(cls) }
+        if unknown := obj.keys() - fields.keys():
+            msg = f"unknown DNS cache policy setting(s): {', '.join(sorted(unknown))}"
+            raise ValueError(msg)
+
+        for key, value in obj.items():
+            if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+                msg = f"DNS cache policy setting {key} must be a non-negative integer"
+                raise ValueError(msg)
+
+        return cls(**{ fields[key]: value for key, value in obj.items() })
+
+    def override(self, other: "CachePolicy") -> "CachePolicy":
+        """Return a copy of this policy, with the fields set in `other` overriden."""
+        return dataclasses.replace(self, **{
+            f.name: getattr(other, f.name)
+            for f in dataclasses.fields(other)
+            if getattr(other, f.name) is not None
+        })
+
+    def options(self) -> dict[str, int]:
+        """Render the policy as (a subset of) a Hickory forward store's `options`."""
+        return {
+            f.name: getattr(self, f.name)
+            for f in dataclasses.fields(self)
+            if getattr(self, f.name) is not None
+        }
+
+
+Protocol = Literal["udp", "tcp", "tls", "quic"]
+
+_DEFAULT_PORTS: dict[Protocol, int] = { "udp": 53, "tcp": 53, "tls": 853, "quic": 853 }
+
+
+@dataclass(frozen = True, slots = True)
+class Upstream:
+    """A DNS resolver which queries are forwarded to.
+
+    `udp` upstreams are retried over TCP when a response is truncated.
+    """
+
+    address: str
+    protocol: Protocol = "udp"
+    port: int | None = None
+    tls_name: str | None = None  # name to authenticate the upstream as, for TLS and QUIC
+
+    def __post_init__(self) -> None:
+        """Check the address is an IP, its protocol supported, and TLS ones have a name to verify.
+
+        Raises:
+            ValueError: if the upstream is misconfigured.
+
+        """
+        try:
+            ipaddress.ip_address(self.address)
+        except ValueError:
+            # Hickory's forwarders take socket addresses, it doesn't resolve their names
+            msg = (
+                f"DNS upstream {self.address!r} must be an IP address,"
+                " with the name to verify after `#`, e.g. tls://9.9.9.9#dns.quad9.net"
+            )
+            raise ValueError(msg) from None
+        if self.protocol not in _DEFAULT_PORTS:
+            msg = f"unsupported DNS upstream protocol {self.protocol!r}"
+            raise ValueError(msg)
+        if self.protocol in { "tls", "quic" } and not self.tls_name:
+            msg = f"DNS upstream {self.address} requires a TLS name, over {self.protocol}"
+            raise ValueError(msg)
+
+    @classmethod
+    def parse(cls, spec: str) -> "Upstream":
+        """Parse an upstream from `[protocol://]address[:port][#tls-name]`.
+
+        For instance `9.9.9.9`, `tcp://[2620:fe::fe]:53` or `quic://9.9.9.9#dns.quad9.net`.
+
+        Raises:
+            ValueError: if `spec` cannot be parsed.
+
+        """
+        url = urllib.parse.urlsplit(spec if "://" in spec else f"udp://{spec}")
+        if not url.hostname:
+            msg = f"invalid DNS upstream {spec!r}"
+            raise ValueError(msg)
+
+        return cls(
+            address = url.hostname,
+            protocol = url.scheme,  # type: ignore[arg-type]
+            port = url.port,
+            tls_name = url.fragment or None,
+        )
+
+    def name_server(self) -> dict[str, Any]:
+        """Render the upstream as a Hickory forward store's `name_servers` entry."""
+        address = ipaddress.ip_address(self.address)
+        port = self.port or _DEFAULT_PORTS[self.protocol]
+        return {
+            "socket_addr": (
+                f"[{address}]:{port}" if isinstance(address, ipaddress.IPv6Address)
+                else f"{address}:{port}"
+            ),
+            "protocol": self.protocol,
+            "trust_negative_responses": True,
+        } | ({ "tls_dns_name": self.tls_name } if self.tls_name else {})
+
+
+def _camel_case(name: str) -> str:
+    head, *tail = name.split("_")
+    return head + "".join(word.capitalize() for word in tail)
+
+
+def cache_policies(cfg: pulumi.Config, zones: Set[str]) -> dict[str, CachePolicy]:
+    """Get each forward zone's cache policy from the `dnsCache` configuration object.
+
+    Top-level settings apply to all zones, and can be overriden per-zone under `zones`:
+      dnsCache:
+        cacheSize: 8192
+        negativeMaxTtl: 300
+        zones:
+          cluster.local: { negativeMaxTtl: 5 }
+
+    Raises:
+        ValueError: if overrides are given for zones not in `zones`.
+
+    """
+    settings = dict(cfg.get_object("dnsCache") or {})
+    overrides = settings.pop("zones", {})
+    if unknown := overrides.keys() - zones:
+        msg = f"DNS cache policy set for unknown zone(s): {', '.join(sorted(unknown))}"
+        raise ValueError(msg)
+
+    default = CachePolicy.from_config(settings)
+    return {
+        zone: default.override(CachePolicy.from_config(overrides.get(zone, {})))
+        for zone in zones
+    }
+
+
+def upstreams(cfg: pulumi.Config) -> list[Upstream]:
+    """Get the `upstreamDns` resolvers, see :py:meth:`Upstream.parse`.
+
+    A list of resolvers, or a single one as a plain string, as `upstreamDns` used to be.
+    """
+    try:
+        specs = cfg.require_object("upstreamDns")
+    except pulumi.ConfigTypeError:
+        specs = cfg.require("upstreamDns")  # not JSON, e.g. `1.1.1.1`
+    return [ Upstream.parse(spec) for spec in ([ specs ] if isinstance(specs, str) else specs) ]
+
+
+def upstream_concurrency(cfg: pulumi.Config) -> int:
+    """Get the number of upstreams queried in parallel, `upstreamConcurrency`, 2 by default.
+
+    Raises:
+        ValueError: if it is below 1.
+
+    """
+    if (concurrency := cfg.get_int("upstreamConcurrency")) is None:
+        return 2
+    if concurrency < 1:
+        msg = f"upstreamConcurrency must be at least 1, not {concurrency}"
+        raise ValueError(msg)
+    return concurrency
+
+
+HICKORY_ADDRESS = "10.96.0.53"
+"""Cluster IP of the DNS cache, which kubelets hand out to pods as their resolver.
+
+Set as the kubelets' `clusterDNS` by `cluster.py`.
+"""
+COREDNS_ADDRESS = "10.96.0.10"
+"""Cluster IP of `kube-dns`, i.e. CoreDNS, as set up by kind."""
+
+
+class DnsCacheDeployment(Component):
+    """The DNS cache, as a component resource."""
+
+    resolvers: k8s.apps.v1.DaemonSet
+    service: k8s.core.v1.Service
+    """Service with the cluster's resolver address, see :py:data:`HICKORY_ADDRESS`."""
+
+
+def deploy(
+    cfg: pulumi.Config, *,
+    zones: Mapping[str, pulumi.Input[str]] | None = None,
+    forwards: Mapping[str, Sequence[Upstream]] | None = None,
+    depends_on: Sequence[pulumi.Input[pulumi.Resource]] = (),
+) -> DnsCacheDeployment:
     """Deploy a local DNS cache on each node, and update host-side `resolv.conf`.
 
     The resolver is Hickory DNS, configured with the following zones:
     - `cluster.local`, forwarded to `kube-dns` ;
-    - `.`, forwarded to `9.9.9.9`.
+    - `.`, forwarded to the `upstreamDns` resolvers, see :py:func:`upstreams`.
+
+    Hickory keeps connections to upstreams open across queries, so the handshake cost
+    of TCP, TLS and QUIC upstreams is only paid once per connection.
+
+    Each forward zone's cache is sized according to :py:func:`cache_policies`.
+
+    Additional zones, e.g. rendered by :py:func:`dns.zone.render`, are served authoritatively.
+    The DaemonSet is only rolled out once their contents are known.
+    Additional `forwards` zones are forwarded to their own upstreams.
+
+    With `dnsNodeLocal` set, pods are served by the resolver on their own node when it is ready.
     """
     labels = { "app": "dns-cache" }
-    ns = k8s.core.v1.Namespace("dns")
+    component = DnsCacheDeployment("dns-cache")
+    ns = k8s.core.v1.Namespace("dns", opts = component.child())
     meta = k8s.meta.v1.ObjectMetaArgs(namespace = ns.metadata.name, labels = labels)
-    hickory_address = "10.96.0.53"
-    coredns_address = "10.96.0.10"
 
     zones_dir = importlib.resources.files(__package__) / "default_zones"
+    primary_zones: dict[str, pulumi.Input[str]] = {
+        zone_file.name.removesuffix(".zone"): zone_file.read_text()
+        for zone_file in zones_dir.iterdir()
+    } | dict(zones or {})
+    forwards = {
+        "cluster.local": [ Upstream(COREDNS_ADDRESS) ],
+        ".": upstreams(cfg),
+    } | dict(forwards or {})
+    policies = cache_policies(cfg, forwards.keys())
+    forwarding = {
+        # Fall back to TCP for truncated responses, while avoiding a handshake on each miss
+        "try_tcp_on_error": True,
+        # Query upstreams concurrently, the fastest answer wins
+        "num_concurrent_reqs": upstream_concurrency(cfg),
+        # Prefer upstreams which answered fastest so far
+        "server_ordering_strategy": "QueryStatistics",
+    }
 
-    _ = k8s.apps.v1.DaemonSet(
+    resolvers = k8s.apps.v1.DaemonSet(
         "dns-cache",
         metadata = meta,
+        opts = component.child(),
         spec = k8s.apps.v1.DaemonSetSpecArgs(
             selector = k8s.meta.v1.LabelSelectorArgs(match_labels = labels),
             template = k8s.core.v1.PodTemplateSpecArgs(
@@ -46,7 +292,7 @@ def deploy(cfg: pulumi.Config) -> k8s.core.v1.Service:
                     containers = (
                         k8s.core.v1.ContainerArgs(
                             name = "hickory-dns",
-                            image = "docker.io/hickorydns/hickory-dns:latest",
+                            image = images.HICKORY_DNS,
                             image_pull_policy = "IfNotPresent",
                             args = [
                                 "-c", "/run/cm/hickory.toml",
@@ -59,7 +305,8 @@ def deploy(cfg: pulumi.Config) -> k8s.core.v1.Service:
                                 )
                                 for proto in ( "TCP", "UDP" )
                             ],
-                            # TODO use a build with Prometheus metrics, set {live, readi}ness_probe
+                            # TODO use a build with Prometheus metrics, set liveness_probe
+                            readiness_probe = tcp_socket("dns-tcp"),
                             volume_mounts = [
                                 k8s.core.v1.VolumeMountArgs(
                                     name = "config",
@@ -77,7 +324,7 @@ def deploy(cfg: pulumi.Config) -> k8s.core.v1.Service:
                     init_containers = (  # HACK this should ideally run once hickory-dns is up
                         k8s.core.v1.ContainerArgs(
                             name = "update-host-resolvconf",
-                            image = "busybox",
+                            image = images.BUSYBOX,
                             image_pull_policy = "IfNotPresent",
                             args = [ "sh", "-c", "cat /run/cm/resolv.conf > /host/resolv.conf" ],
                             volume_mounts = [
@@ -108,39 +355,39 @@ def deploy(cfg: pulumi.Config) -> k8s.core.v1.Service:
                                 name = k8s.core.v1.ConfigMap(
                                     "dns-cache-cm",
                                     metadata = meta,
+                                    opts = component.child(),
                                     data = {
                                         "resolv.conf": "\n".join((
-                                            f"nameserver {hickory_address}",
+                                            f"nameserver {HICKORY_ADDRESS}",
                                             "search svc.cluster.local cluster.local",
                                             "options edns0 trust-ad ndots:5",
                                         )) + "\n",
                                         "hickory.toml": tomlkit.dumps({
                                             "listen_addrs_ipv4": [ "0.0.0.0" ],
-                                            # TODO DNS-over-QUIC
                                             "zones": [
                                                 {
                                                     "zone": zone,
                                                     "zone_type": "External",
                                                     "stores": {
                                                         "type": "forward",
-                                                        "name_servers": [ {
-                                                            "socket_addr": addr,
-                                                            "protocol": "tcp",
-                                                            "trust_negative_responses": True,
-                                                        } ],
+                                                        "name_servers": [
+                                                            upstream.name_server()
+                                                            for upstream in upstreams
+                                                        ],
+                                                        "options": {
+                                                            **policies[zone].options(),
+                                                            **forwarding,
+                                                        },
                                                     },
                                                 }
-                                                for zone, addr in {
-                                                    "cluster.local": f"{coredns_address}:53",
-                                                    ".": f"{cfg.require('upstreamDns')}:53",
-                                                }.items()
+                                                for zone, upstreams in forwards.items()
                                             ] + [
                                                 {
-                                                    "zone": zone_file.name.removesuffix(".zone"),
+                                                    "zone": zone,
                                                     "zone_type": "Primary",
-                                                    "file": zone_file.name,
+                                                    "file": f"{zone}.zone",
                                                 }
-                                                for zone_file in zones_dir.iterdir()
+                                                for zone in primary_zones
                                             ],
                                         }),
                                     },
@@ -153,9 +400,10 @@ def deploy(cfg: pulumi.Config) -> k8s.core.v1.Service:
                                 name = k8s.core.v1.ConfigMap(
                                     "dns-cache-zones",
                                     metadata = meta,
+                                    opts = component.child(),
                                     data = {
-                                        zone_file.name: zone_file.read_text()
-                                        for zone_file in zones_dir.iterdir()
+                                        f"{zone}.zone": contents
+                                        for zone, contents in primary_zones.items()
                                     },
                                 ).metadata.name,
                             ),
@@ -166,12 +414,13 @@ def deploy(cfg: pulumi.Config) -> k8s.core.v1.Service:
         ),
     )
 
-    return k8s.core.v1.Service(
+    svc = k8s.core.v1.Service(
         "dns-cache",
         metadata = meta,
+        opts = component.child(),
         spec = k8s.core.v1.ServiceSpecArgs(
             type = "ClusterIP",
-            cluster_ip = hickory_address,
+            cluster_ip = HICKORY_ADDRESS,
             ports = [
                 k8s.core.v1.ServicePortArgs(
                     name = f"dns-{proto.lower()}",
@@ -184,3 +433,33 @@ def deploy(cfg: pulumi.Config) -> k8s.core.v1.Service:
             selector = labels,
         ),
     )
+
+    if cfg.get_bool("dnsNodeLocal"):
+        # Answer pods' queries from the resolver on their own node, rather than load-balancing
+        #  them across the cluster; requires Cilium's `local-redirect-policy` feature.
+        # Only ready local backends are selected, otherwise the Service's own backends are used.
+        _ = k8s.apiextensions.CustomResource(
+            "dns-cache-node-local",
+            api_version = "cilium.io/v2",
+            kind = "CiliumLocalRedirectPolicy",
+            metadata = meta,
+            opts = component.child(depends_on = depends_on),
+            spec = {
+                "redirectFrontend": {
+                    "serviceMatcher": {
+                        "serviceName": svc.metadata.name,
+                        "namespace": svc.metadata.namespace,
+                    },
+                },
+                "redirectBackend": {
+                    "localEndpointSelector": { "matchLabels": labels },
+                    "toPorts": [
+                        { "name": f"dns-{proto.lower()}", "port": "53", "protocol": proto }
+                        for proto in ("TCP", "UDP")
+                    ],
+                },
+            },
+        )
+
+    component.register(resolvers = resolvers, service = svc)
+    return component
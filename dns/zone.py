@@ -0,0 +1,36 @@
+"""Render authoritative zone files, for Hickory DNS to serve as `Primary` zones."""
+
+import ipaddress
+import zlib
+from collections.abc import Iterable, Mapping
+
+
+def render(origin: str, records: Mapping[str, Iterable[str]], ttl: int = 60) -> str:
+    """Render a zone file for `origin`, mapping each name to its IPv4 and IPv6 addresses.
+
+    Names outside of `origin` are ignored.
+    The TTL is kept short, as addresses (e.g. assigned to load-balancers) may change.
+    """
+    lines = [
+        f"{name.removesuffix(origin).rstrip('.') or '@':<24}"
+        f"{'AAAA' if isinstance(address, ipaddress.IPv6Address) else 'A':<9}{address}"
+        for name, addresses in sorted(records.items())
+        if name == origin or name.endswith(f".{origin}")
+        for address in sorted(map(ipaddress.ip_address, addresses), key = str)
+    ]
+    # derive the serial from the zone's contents, so it changes along with them
+    serial = zlib.crc32("\n".join(lines).encode())
+
+    return "\n".join((
+        f"$ORIGIN {origin}.",
+        f"$TTL {ttl}",
+        "@               IN      SOA     cluster.local. root.cluster.local. (",
+        f"                                {serial}       ; Serial",
+        "                                28800   ; Refresh",
+        "                                7200    ; Retry",
+        "                                604800  ; Expire",
+        f"                                {ttl})  ; Minimum TTL",
+        "                        NS      dns-cache.dns.svc.cluster.local.",
+        "",
+        *lines,
+    )) + "\n"
@@ -1,15 +1,30 @@
 """Deploy a Gateway API implementation.
 
 The Gateway API supersedes the Ingress API, capturing L7 routing rules in a frontend-agnostic way.
+:py:func:`web_service` deploys an autoscaled HTTP service routed from the gateway.
 """
 
-from collections.abc import Sequence
-from dataclasses import dataclass
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass, field
 from functools import cache, reduce
+from typing import Any, Literal
 
 import pulumi
 import pulumi_kubernetes as k8s
 
+import artifacts
+import utils
+from component import Component
+
+DOMAIN = "k8s.local"
+"""Domain under which hostnames are routed by the default gateway."""
+
+Implementation = Literal["nginx", "cilium"]
+
+NGINX_GATEWAY = "nginx-gateway-fabric"
+"""Name of the Helm release, and of the Deployment running the control and data planes."""
+DEFAULT_GATEWAY = "default-gw"
+
 
 @cache
 def crds() -> pulumi.Resource:
@@ -19,45 +34,182 @@ def crds() -> pulumi.Resource:
     """
     return k8s.yaml.v2.ConfigFile(
         "gateway-api-CRDs",
-        file = "https://github.com/kubernetes-sigs/gateway-api/releases/download/v1.2.0/standard-install.yaml",
+        file = str(artifacts.path(artifacts.GATEWAY_API_CRDS)),
+    )
+
+
+@cache
+def tls_route_crd() -> pulumi.Resource:
+    """Deploy the experimental `TLSRoute` CRD, which Cilium requires to enable the Gateway API.
+
+    Singleton, like :py:func:`crds`.
+    """
+    return k8s.yaml.v2.ConfigFile(
+        "gateway-api-TLSRoute-CRD",
+        file = str(artifacts.path(artifacts.GATEWAY_API_TLSROUTE_CRD)),
     )
 
 
 @dataclass(frozen = True, slots = True)
-class GatewayDeployment:
-    """Typed dict for :py:func:`gateway.deploy`'s return type."""
+class Profile:
+    """Performance settings of the gateway's data plane.
+
+    `nginx` already runs one worker process per CPU; NGF 1.x doesn't allow changing
+    its `worker_connections`.
+    """
+
+    min_replicas: int = 2
+    max_replicas: int = 4
+    """The data plane is autoscaled on CPU usage between those bounds, if they differ."""
+    cpu_utilization: int = 70
+    """Target average CPU usage of `nginx`, in percent of its requests."""
+    cpu_request: str = "100m"
+    http2: bool = True
+    keepalive_connections: int = 32
+    """Idle connections to each upstream kept open by each worker, or 0 to disable."""
+    keepalive_requests: int = 1000
+    keepalive_timeout: str = "60s"
+    proxy_buffers: tuple[int, str] = ( 8, "16k" )
+    """Number and size of the buffers holding each upstream response, see `proxy_buffers`."""
+
+    @property
+    def autoscaled(self) -> bool:
+        """Whether the data plane's replicas are managed by an autoscaler."""
+        return self.min_replicas != self.max_replicas
+
+    def values(self) -> dict[str, Any]:
+        """Render the chart's values."""
+        return {
+            "nginxGateway": {
+                "replicaCount": self.min_replicas,
+                "snippetsFilters": { "enable": True },
+            },
+            # applied through the `NginxProxy` resource
+            "nginx": { "config": { "disableHTTP2": not self.http2 } },
+            "topologySpreadConstraints": [ {
+                "maxSkew": 1,
+                "topologyKey": "kubernetes.io/hostname",
+                "nodeTaintsPolicy": "Honor",
+                "whenUnsatisfiable": "ScheduleAnyway",
+                "labelSelector": {
+                    "matchLabels": { "app.kubernetes.io/instance": NGINX_GATEWAY },
+                },
+            } ],
+        }
+
+    def transform(
+        self, args: pulumi.ResourceTransformArgs,
+    ) -> pulumi.ResourceTransformResult | None:
+        """Set the data plane's resources, which the chart's values cannot.
+
+        When autoscaled, `replicas` is dropped so Pulumi doesn't reset the autoscaler's choice.
+        """
+        name = args.name.rpartition("/")[2]
+        if args.type_ != "kubernetes:apps/v1:Deployment" or name != NGINX_GATEWAY:
+            return None
+
+        spec = dict(args.props["spec"])
+        if self.autoscaled:
+            spec.pop("replicas", None)
+        template = spec["template"]
+        spec["template"] = { **template, "spec": { **template["spec"], "containers": [
+            container | {
+                "resources": { "requests": { "cpu": self.cpu_request, "memory": "64Mi" } },
+            } if container["name"] == "nginx" else container
+            for container in template["spec"]["containers"]
+        ] } }
+
+        return pulumi.ResourceTransformResult({ **args.props, "spec": spec }, args.opts)
+
+
+@dataclass(frozen = True, slots = True)
+class GatewayRef:
+    """The default gateway, as routes attach to it, see :py:func:`http_route`.
+
+    It is either deployed by this stack, see :py:attr:`GatewayDeployment.ref`,
+    or by another one, see :py:meth:`from_stack`.
+    """
+
+    namespace: pulumi.Input[str]
+    implementation: Implementation
+    profile: Profile = field(default_factory = Profile)
+    chart: k8s.helm.v4.Chart | None = None
+    """Nginx Gateway Fabric's chart, if it is the implementation and deployed by this stack."""
+    crds: pulumi.Resource | None = None
+    """The Gateway API's CRDs, if installed by this stack."""
+    hostnames: set[str] = field(default_factory = set)
+    """Hostnames of the routes declared through :py:func:`http_route`."""
+
+    @classmethod
+    def from_stack(
+        cls, stack: pulumi.StackReference, implementation: Implementation,
+    ) -> "GatewayRef":
+        """Refer to the gateway deployed by another stack, with the default profile.
+
+        The implementation must be given as configured on that stack: it decides which
+        resources routes need, so it cannot wait for the stack's outputs.
+        """
+        return cls(stack.require_output("gateway-namespace"), implementation)
+
+
+class GatewayDeployment(Component):
+    """The Gateway API implementation and the default gateway, as a component resource."""
 
     namespace: k8s.core.v1.Namespace
-    chart: k8s.helm.v4.Chart
+    chart: k8s.helm.v4.Chart | None
+    """Nginx Gateway Fabric's chart, if it is the implementation."""
     gw: k8s.apiextensions.CustomResource
+    addresses: pulumi.Output[list[str]]
+    ref: GatewayRef
 
 
-def deploy(depends_on: Sequence[pulumi.Resource] = ()) -> GatewayDeployment:
-    """Deploy Nginx Gateway Fabric as the Gateway API implementation."""
-    namespace = k8s.core.v1.Namespace("gateway")
+def deploy(
+    depends_on: Sequence[pulumi.Input[pulumi.Resource]] = (), *,
+    implementation: Implementation = "nginx",
+    profile: Profile = Profile(),  # noqa: B008
+) -> GatewayDeployment:
+    """Deploy a Gateway API implementation, and the default gateway.
 
-    chart = k8s.helm.v4.Chart(
-        "nginx-gateway-fabric",
-        chart = "oci://ghcr.io/nginx/charts/nginx-gateway-fabric",
-        version = "1.6.2",
-        namespace = namespace.metadata.name,
-        opts = pulumi.ResourceOptions(depends_on = [ crds(), *depends_on ]),
-    )
+    With `nginx`, Nginx Gateway Fabric runs a separate proxy tier, tuned by `profile`.
+    With `cilium`, the gateway is served by Cilium's per-node Envoy, without an extra hop;
+    this requires Cilium's `gateway-api` feature.
+    """
+    component = GatewayDeployment("gateway")
+    namespace = k8s.core.v1.Namespace("gateway", opts = component.child())
+
+    if implementation == "nginx":
+        chart = _nginx_gateway_fabric(component, namespace, profile, depends_on)
+    else:
+        chart = None
+        k8s.apiextensions.CustomResource(
+            "cilium-gateway-class",
+            api_version = "gateway.networking.k8s.io/v1",
+            kind = "GatewayClass",
+            metadata = k8s.meta.v1.ObjectMetaArgs(name = "cilium"),
+            opts = component.child(depends_on = [ crds(), *depends_on ]),
+            spec = { "controllerName": "io.cilium/gateway-controller" },
+        )
 
     # TODO: find a reasonable way to handle CRDs, crd2pulumi is not useable as-is
     default_gw = k8s.apiextensions.CustomResource(
-        "default-gw",
+        DEFAULT_GATEWAY,
         api_version = "gateway.networking.k8s.io/v1",
         kind = "Gateway",
-        metadata = k8s.meta.v1.ObjectMetaArgs(namespace = namespace.metadata.name),
-        opts = pulumi.ResourceOptions(depends_on = crds()),
+        metadata = k8s.meta.v1.ObjectMetaArgs(
+            # don't use automatic naming, as Cilium names the gateway's Service after it
+            name = DEFAULT_GATEWAY,
+            namespace = namespace.metadata.name,
+            # wait for the gateway to be served, and its address assigned
+            annotations = { "pulumi.com/waitFor": "condition=Programmed" },
+        ),
+        opts = component.child(depends_on = crds()),
         spec = {
-            "gatewayClassName": "nginx",
+            "gatewayClassName": implementation,
             "listeners": [ {
                 "name": "http",
                 "port": 80,
                 "protocol": "HTTP",
-                "hostname": "*.k8s.local",
+                "hostname": f"*.{DOMAIN}",
                 "allowedRoutes": {
                     "kinds": [ { "kind": "HTTPRoute" } ],
                     "namespaces": { "from": "All" },  # TODO: restrict to specific namespaces
@@ -66,14 +218,12 @@ def deploy(depends_on: Sequence[pulumi.Resource] = ()) -> GatewayDeployment:
         },
     )
 
-    pulumi.export(
-        "nginx-ingress",
-        chart.resources.apply(lambda resources: pulumi.Output.all(*(
+    if chart is not None:
+        # NGF 1.x exposes all gateways through the chart's Service
+        addresses = chart.resources.apply(lambda resources: pulumi.Output.all(*(
             pulumi.Output.all(
-                ips = svc.status.load_balancer.apply(
-                    lambda lb: [ ingress.ip for ingress in lb.ingress or [] ],
-                ),
-                pred = svc.metadata.apply(lambda m: m.name == "nginx-gateway-fabric"),
+                ips = _load_balancer_ips(svc),
+                pred = svc.metadata.apply(lambda m: m.name == NGINX_GATEWAY),
             )
             for svc in resources  # type: ignore
             if isinstance(svc, k8s.core.v1.Service)
@@ -81,7 +231,311 @@ def deploy(depends_on: Sequence[pulumi.Resource] = ()) -> GatewayDeployment:
             lambda acc, x: acc + (x["ips"] if x["pred"] else []),
             out,
             [],
-        )),
+        ))
+    else:
+        addresses = _load_balancer_ips(k8s.core.v1.Service.get(
+            "cilium-gateway-default-gw",
+            pulumi.Output.concat(namespace.metadata.name, "/cilium-gateway-default-gw"),
+            opts = component.child(depends_on = default_gw),
+        ))
+    pulumi.export("nginx-ingress", addresses)
+    # for stacks declaring routes, see `GatewayRef.from_stack`
+    pulumi.export("gateway-namespace", namespace.metadata.name)
+
+    component.register(
+        namespace = namespace, chart = chart, gw = default_gw, addresses = addresses,
+        ref = GatewayRef(namespace.metadata.name, implementation, profile, chart, crds()),
+    )
+    return component
+
+
+def _nginx_gateway_fabric(
+    component: Component,
+    namespace: k8s.core.v1.Namespace,
+    profile: Profile,
+    depends_on: Sequence[pulumi.Input[pulumi.Resource]],
+) -> k8s.helm.v4.Chart:
+    """Deploy Nginx Gateway Fabric, tuned by `profile`."""
+    chart = k8s.helm.v4.Chart(
+        NGINX_GATEWAY,
+        chart = str(artifacts.path(artifacts.NGINX_GATEWAY_FABRIC_CHART)),
+        namespace = namespace.metadata.name,
+        values = profile.values(),
+        opts = component.child(
+            depends_on = [ crds(), *depends_on ],
+            transforms = [ profile.transform ],
+        ),
+    )
+
+    if profile.autoscaled:
+        k8s.autoscaling.v2.HorizontalPodAutoscaler(
+            NGINX_GATEWAY,
+            metadata = k8s.meta.v1.ObjectMetaArgs(namespace = namespace.metadata.name),
+            opts = component.child(depends_on = chart),
+            spec = k8s.autoscaling.v2.HorizontalPodAutoscalerSpecArgs(
+                scale_target_ref = k8s.autoscaling.v2.CrossVersionObjectReferenceArgs(
+                    api_version = "apps/v1",
+                    kind = "Deployment",
+                    name = NGINX_GATEWAY,
+                ),
+                min_replicas = profile.min_replicas,
+                max_replicas = profile.max_replicas,
+                # only the data plane scales with traffic, and has resource requests
+                metrics = [ k8s.autoscaling.v2.MetricSpecArgs(
+                    type = "ContainerResource",
+                    container_resource = k8s.autoscaling.v2.ContainerResourceMetricSourceArgs(
+                        container = "nginx",
+                        name = "cpu",
+                        target = k8s.autoscaling.v2.MetricTargetArgs(
+                            type = "Utilization",
+                            average_utilization = profile.cpu_utilization,
+                        ),
+                    ),
+                ) ],
+            ),
+        )
+
+    return chart
+
+
+def _load_balancer_ips(svc: k8s.core.v1.Service) -> pulumi.Output[list[str]]:
+    """Get the addresses a LoadBalancer Service was assigned, skipping hostname-only ingresses."""
+    return svc.status.apply(lambda status: [
+        ingress.ip
+        for ingress in (status and status.load_balancer and status.load_balancer.ingress) or []
+        if ingress.ip
+    ])
+
+
+def http_route(
+    name: str, gw: GatewayRef, *,
+    hostnames: Sequence[str],
+    rules: Sequence[Any],
+    metadata: k8s.meta.v1.ObjectMetaArgs | None = None,
+) -> k8s.apiextensions.CustomResource:
+    """Declare an `HTTPRoute` attached to the default gateway's HTTP listener.
+
+    Hostnames are recorded in the :py:class:`GatewayRef`, so they can be resolved locally.
+    With Nginx Gateway Fabric, the gateway's :py:class:`Profile` is applied to the route,
+    and to its backends' upstreams.
+    """
+    gw.hostnames.update(hostnames)
+    if gw.implementation == "nginx":
+        rules = _tune_route(name, gw.chart, gw.profile, rules, metadata)
+
+    return k8s.apiextensions.CustomResource(
+        name,
+        api_version = "gateway.networking.k8s.io/v1",
+        kind = "HTTPRoute",
+        metadata = metadata,
+        opts = pulumi.ResourceOptions(depends_on = gw.crds),
+        spec = {
+            "parentRefs": [ {
+                "name": DEFAULT_GATEWAY,
+                "namespace": gw.namespace,
+                "sectionName": "http",
+            } ],
+            "hostnames": hostnames,
+            "rules": rules,
+        },
+    )
+
+
+def _tune_route(
+    name: str, chart: k8s.helm.v4.Chart | None, profile: Profile,
+    rules: Sequence[Any],
+    metadata: k8s.meta.v1.ObjectMetaArgs | None,
+) -> list[Any]:
+    """Apply NGF's tuning to a route's backends, and return its rules with the route's filters."""
+    count, size = profile.proxy_buffers
+    snippets = _ngf_resource(
+        f"{name}-snippets", chart, "SnippetsFilter", "snippetsfilters",
+        metadata = metadata,
+        spec = { "snippets": [ {
+            "context": "http.server.location",
+            "value": f"proxy_buffers {count} {size}; proxy_buffer_size {size};",
+        } ] },
+    )
+    snippets_filter = {
+        "type": "ExtensionRef",
+        "extensionRef": {
+            "group": "gateway.nginx.org",
+            "kind": "SnippetsFilter",
+            "name": snippets.metadata["name"],
+        },
+    }
+
+    services = [ ref["name"] for rule in rules for ref in rule.get("backendRefs", ()) ]
+    if services and profile.keepalive_connections:
+        _ngf_resource(
+            f"{name}-upstreams", chart, "UpstreamSettingsPolicy", "upstreamsettingspolicies",
+            metadata = metadata,
+            spec = {
+                "targetRefs": [
+                    { "group": "", "kind": "Service", "name": service } for service in services
+                ],
+                "keepAlive": {
+                    "connections": profile.keepalive_connections,
+                    "requests": profile.keepalive_requests,
+                    "timeout": profile.keepalive_timeout,
+                },
+            },
+        )
+
+    return [
+        { **rule, "filters": [ *rule.get("filters", ()), snippets_filter ] } for rule in rules
+    ]
+
+
+def _ngf_resource(  # noqa: PLR0913
+    name: str, chart: k8s.helm.v4.Chart | None, kind: str, plural: str, *,
+    spec: dict[str, Any],
+    metadata: k8s.meta.v1.ObjectMetaArgs | None = None,
+) -> k8s.apiextensions.CustomResource:
+    """Declare one of NGF's custom resources.
+
+    It depends on its CRD, installed by the chart, unless the chart is deployed by another stack;
+    it is thus only created once the chart's resources are ready, see `utils.chart_resource`.
+    """
+    return k8s.apiextensions.CustomResource(
+        name,
+        api_version = "gateway.nginx.org/v1alpha1",
+        kind = kind,
+        metadata = metadata,
+        opts = pulumi.ResourceOptions(depends_on = [ utils.chart_resource(
+            chart, k8s.apiextensions.v1.CustomResourceDefinition,
+            f"{plural}.gateway.nginx.org",
+        ) ] if chart is not None else []),
+        spec = spec,
+    )
+
+
+@dataclass(frozen = True, slots = True)
+class WebService:
+    """Typed dict for :py:func:`web_service`'s return type."""
+
+    deployment: k8s.apps.v1.Deployment
+    service: k8s.core.v1.Service
+    route: k8s.apiextensions.CustomResource
+    autoscaler: k8s.autoscaling.v2.HorizontalPodAutoscaler
+    disruption_budget: k8s.policy.v1.PodDisruptionBudget
+
+
+def web_service(  # noqa: PLR0913
+    name: str, image: str, gw: GatewayRef, *,
+    namespace: pulumi.Input[str],
+    hostnames: Sequence[str],
+    port: int = 8080,
+    health_path: str = "/",
+    requests: Mapping[str, str] | None = None,
+    limits: Mapping[str, str] | None = None,
+    scaling: utils.Scaling = utils.Scaling(),  # noqa: B008
+    depends_on: Sequence[pulumi.Input[pulumi.Resource]] = (),
+) -> WebService:
+    """Deploy an HTTP service, routed from the gateway and scaling with its CPU usage.
+
+    Pods are spread across nodes, and at most one is voluntarily disrupted at a time.
+    By default, they request 50m CPU and 64Mi of memory, and are limited to 128Mi;
+    CPU isn't limited, as throttling hurts latency more than it protects neighbours.
+    """
+    labels = { "app": name }
+    meta = k8s.meta.v1.ObjectMetaArgs(namespace = namespace, labels = labels)
+    selector = k8s.meta.v1.LabelSelectorArgs(match_labels = labels)
+
+    deployment = k8s.apps.v1.Deployment(
+        name,
+        metadata = meta,
+        opts = pulumi.ResourceOptions(depends_on = depends_on),
+        spec = k8s.apps.v1.DeploymentSpecArgs(
+            # no `replicas`: the autoscaler owns it, and Pulumi shouldn't reset it
+            selector = selector,
+            template = k8s.core.v1.PodTemplateSpecArgs(
+                metadata = k8s.meta.v1.ObjectMetaArgs(labels = labels),
+                spec = k8s.core.v1.PodSpecArgs(
+                    containers = [ k8s.core.v1.ContainerArgs(
+                        name = name,
+                        image = image,
+                        ports = [ k8s.core.v1.ContainerPortArgs(
+                            name = "http",
+                            container_port = port,
+                        ) ],
+                        liveness_probe = utils.http_get(health_path),
+                        readiness_probe = utils.http_get(health_path),
+                        resources = k8s.core.v1.ResourceRequirementsArgs(
+                            requests = requests or { "cpu": "50m", "memory": "64Mi" },
+                            limits = limits or { "memory": "128Mi" },
+                        ),
+                    ) ],
+                    topology_spread_constraints = [
+                        k8s.core.v1.TopologySpreadConstraintArgs(
+                            label_selector = selector,
+                            topology_key = "kubernetes.io/hostname",
+                            max_skew = 1,
+                            # don't count nodes the pods cannot run on, e.g. the control plane
+                            node_taints_policy = "Honor",
+                            when_unsatisfiable = "ScheduleAnyway",
+                        ),
+                    ],
+                ),
+            ),
+        ),
+    )
+
+    autoscaler = k8s.autoscaling.v2.HorizontalPodAutoscaler(
+        name,
+        metadata = meta,
+        spec = k8s.autoscaling.v2.HorizontalPodAutoscalerSpecArgs(
+            scale_target_ref = k8s.autoscaling.v2.CrossVersionObjectReferenceArgs(
+                api_version = "apps/v1",
+                kind = "Deployment",
+                name = deployment.metadata.name,
+            ),
+            min_replicas = scaling.min_replicas,
+            max_replicas = scaling.max_replicas,
+            metrics = [ k8s.autoscaling.v2.MetricSpecArgs(
+                type = "Resource",
+                resource = k8s.autoscaling.v2.ResourceMetricSourceArgs(
+                    name = "cpu",
+                    target = k8s.autoscaling.v2.MetricTargetArgs(
+                        type = "Utilization",
+                        average_utilization = scaling.cpu_utilization,
+                    ),
+                ),
+            ) ],
+        ),
+    )
+
+    disruption_budget = k8s.policy.v1.PodDisruptionBudget(
+        name,
+        metadata = meta,
+        spec = k8s.policy.v1.PodDisruptionBudgetSpecArgs(
+            max_unavailable = 1,
+            selector = selector,
+        ),
+    )
+
+    service = k8s.core.v1.Service(
+        name,
+        metadata = meta,
+        spec = k8s.core.v1.ServiceSpecArgs(
+            ports = [ k8s.core.v1.ServicePortArgs(
+                port = 80,
+                target_port = "http",
+            ) ],
+            selector = labels,
+        ),
+    )
+
+    route = http_route(
+        f"{name}-route", gw,
+        metadata = meta,
+        hostnames = hostnames,
+        rules = [ {
+            "backendRefs": [ {
+                "name": service.metadata.name,
+                "port": 80,
+            } ],
+        } ],
     )
 
-    return GatewayDeployment(namespace, chart, default_gw)
+    return WebService(deployment, service, route, autoscaler, disruption_budget)
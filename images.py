@@ -0,0 +1,30 @@
+"""Container images deployed by this program.
+
+Keeping them in one place lets the OCI cache protect them from eviction,
+and `preload.py` load them into the cluster's nodes.
+"""
+
+BUSYBOX = "docker.io/library/busybox:latest"
+COREDNS = "registry.k8s.io/coredns/coredns:v1.11.3"
+FORTIO = "docker.io/fortio/fortio:1.69.1"
+GRAFANA = "docker.io/grafana/grafana:11.5.2"
+HICKORY_DNS = "docker.io/hickorydns/hickory-dns:latest"
+NGINX = "docker.io/library/nginx:1.27-alpine"
+NGINX_HELLO = "docker.io/nginxdemos/nginx-hello:plain-text"
+OCIREGISTRY = "quay.io/appzygy/ociregistry:1.8.2"
+PROMETHEUS = "quay.io/prometheus/prometheus:v3.2.1"
+PYTHON = "docker.io/library/python:3.13-alpine"
+
+ALL = frozenset({
+    BUSYBOX,
+    COREDNS,
+    FORTIO,
+    GRAFANA,
+    HICKORY_DNS,
+    NGINX,
+    NGINX_HELLO,
+    OCIREGISTRY,
+    PROMETHEUS,
+    PYTHON,
+})
+"""Every image referenced by the program's own workloads."""
@@ -0,0 +1,441 @@
+"""Scrape all components' Prometheus metrics, and chart them in pre-built Grafana dashboards.
+
+Components serve their own metrics, and are discovered through the customary
+`prometheus.io/scrape` and `prometheus.io/port` annotations, on their pods or services:
+- Cilium's agent, operator and Envoy, and Hubble's flow metrics, with the `metrics` feature ;
+- the OCI cache's shards, whose evictor counts hits and misses, see `oci_cache/evict.py` ;
+- Nginx Gateway Fabric, whose chart enables metrics by default.
+
+The DNS cache isn't charted: the published Hickory DNS image isn't built with its
+`prometheus-metrics` feature, so it serves no metrics; the DNS benchmark reports its hit ratio,
+see :py:mod:`benchmark.dnsperf`.
+
+A single Prometheus replica, without persistent storage, scrapes them.
+Grafana is routed from the default gateway, and provisioned with :py:data:`DASHBOARDS`,
+to locate bottlenecks rather than guess them.
+"""
+
+import json
+import re
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass
+from typing import Any
+
+import pulumi
+import pulumi_kubernetes as k8s
+
+import gateway
+import images
+from utils import http_get
+
+HOSTNAME = f"grafana.{gateway.DOMAIN}"
+"""Hostname Grafana is routed from."""
+
+
+@dataclass(frozen = True, slots = True)
+class Panel:
+    """A time series panel, plotting PromQL queries by legend."""
+
+    title: str
+    unit: str
+    """Grafana unit of the values, e.g. `percentunit`, `Bps` or `ms`."""
+    queries: Mapping[str, str]
+    implementation: gateway.Implementation | None = None
+    """Gateway implementation whose metrics are plotted, if only one's: others leave it out."""
+
+
+def _ratio(hits: str, misses: str) -> str:
+    """Build a PromQL expression for the hit ratio of two counters, over 5 minutes."""
+    hits, misses = (f"sum(rate({counter}[5m]))" for counter in ( hits, misses ))
+    return f"{hits} / ({hits} + {misses})"
+
+
+def _quantile(q: float, histogram: str) -> str:
+    """Build a PromQL expression for a quantile of a histogram, over 5 minutes."""
+    return f"histogram_quantile({q}, sum by (le) (rate({histogram}_bucket[5m])))"
+
+
+DASHBOARDS: Mapping[str, Sequence[Panel]] = {
+    "Image cache": (
+        Panel("Blob hit ratio", "percentunit", {
+            "hits": _ratio("oci_cache_hits_total", "oci_cache_misses_total"),
+        }),
+        Panel("Bytes served", "Bps", {
+            "from cache": "sum(rate(oci_cache_served_bytes_total[5m]))",
+            "from upstream": "sum(rate(oci_cache_fetched_bytes_total[5m]))",
+        }),
+        Panel("Volume usage, by shard", "percentunit", {
+            "{{pod}}": "oci_cache_size_bytes / oci_cache_capacity_bytes",
+        }),
+        Panel("Evictions", "Bps", {
+            "{{pod}}": "rate(oci_cache_evicted_bytes_total[5m])",
+        }),
+    ),
+    "Gateway": (
+        # Nginx OSS doesn't export latencies, only Cilium's Envoy does
+        Panel("Request latency", "ms", {
+            f"p{q * 100:g}": _quantile(q, "envoy_http_downstream_rq_time")
+            for q in ( 0.5, 0.95, 0.99 )
+        }, implementation = "cilium"),
+        Panel("Requests", "reqps", {
+            "nginx": "sum(rate(nginx_gateway_fabric_http_requests_total[5m]))",
+            "cilium": "sum(rate(envoy_http_downstream_rq_total[5m]))",
+        }),
+        Panel("Active connections", "short", {
+            "nginx": "sum(nginx_gateway_fabric_connections_active)",
+            "cilium": "sum(envoy_http_downstream_cx_active)",
+        }),
+    ),
+    "Datapath": (
+        Panel("Drops, by reason", "pps", {
+            "{{reason}} ({{direction}})":
+                "sum by (reason, direction) (rate(cilium_drop_count_total[5m]))",
+        }),
+        Panel("Flows, by verdict", "ops", {
+            "{{verdict}}": "sum by (verdict) (rate(hubble_flows_processed_total[5m]))",
+        }),
+        Panel("Forwarded traffic", "Bps", {
+            "{{direction}}": "sum by (direction) (rate(cilium_forward_bytes_total[5m]))",
+        }),
+        Panel("BPF map pressure", "percentunit", {
+            "{{map_name}}": "max by (map_name) (cilium_bpf_map_pressure)",
+        }),
+    ),
+    # no DNS cache dashboard: the Hickory DNS image serves no metrics, see above
+}
+"""Dashboards provisioned in Grafana, by title."""
+
+
+def dashboard(
+    title: str, panels: Sequence[Panel], implementation: gateway.Implementation,
+) -> dict[str, Any]:
+    """Render a dashboard's JSON model, laying its panels out in two columns.
+
+    Panels plotting another gateway implementation's metrics are left out.
+    """
+    panels = [ panel for panel in panels if panel.implementation in { None, implementation } ]
+    return {
+        "uid": re.sub(r"\W+", "-", title.lower()),
+        "title": title,
+        "schemaVersion": 39,
+        "refresh": "30s",
+        "time": { "from": "now-1h", "to": "now" },
+        "panels": [ {
+            "id": i + 1,
+            "type": "timeseries",
+            "title": panel.title,
+            "gridPos": { "x": 12 * (i % 2), "y": 8 * (i // 2), "w": 12, "h": 8 },
+            "datasource": { "type": "prometheus", "uid": "prometheus" },
+            "fieldConfig": { "defaults": { "unit": panel.unit }, "overrides": [] },
+            "targets": [
+                { "refId": chr(ord("A") + j), "expr": expr, "legendFormat": legend }
+                for j, (legend, expr) in enumerate(panel.queries.items())
+            ],
+        } for i, panel in enumerate(panels) ],
+    }
+
+
+def scrape_config(role: str, kind: str) -> dict[str, Any]:
+    """Scrape the targets of a Kubernetes service discovery role, annotated on `kind`."""
+    annotation = f"__meta_kubernetes_{kind}_annotation_prometheus_io"
+    return {
+        "job_name": f"{kind}s",
+        "kubernetes_sd_configs": [ { "role": role } ],
+        "relabel_configs": [
+            {
+                "source_labels": [ f"{annotation}_scrape" ],
+                "action": "keep",
+                "regex": "true",
+            },
+            {
+                "source_labels": [ "__meta_kubernetes_pod_phase" ],
+                "action": "drop",
+                "regex": "Pending|Succeeded|Failed",
+            },
+            # targets are the pods' declared ports, all scraped on the annotated one instead;
+            #  the resulting duplicates are dropped by Prometheus
+            {
+                "source_labels": [ "__address__", f"{annotation}_port" ],
+                "regex": r"(.+?)(?::\d+)?;(\d+)",
+                "replacement": "$1:$2",
+                "target_label": "__address__",
+            },
+            {
+                "source_labels": [ f"{annotation}_path" ],
+                "regex": "(.+)",
+                "target_label": "__metrics_path__",
+            },
+            *(
+                { "source_labels": [ f"__meta_kubernetes_{meta}" ], "target_label": label }
+                for meta, label in {
+                    "namespace": "namespace",
+                    "pod_name": "pod",
+                    "pod_node_name": "node",
+                }.items()
+            ),
+        ],
+    }
+
+
+@dataclass(frozen = True, slots = True)
+class MetricsDeployment:
+    """Typed dict for :py:func:`metrics.deploy`'s return type."""
+
+    prometheus: k8s.apps.v1.Deployment
+    grafana: k8s.apps.v1.Deployment
+    route: k8s.apiextensions.CustomResource
+    """Route from :py:data:`HOSTNAME` to Grafana."""
+
+
+def deploy(
+    cfg: pulumi.Config, gw: gateway.GatewayRef, *,
+    depends_on: Sequence[pulumi.Input[pulumi.Resource]] = (),
+) -> MetricsDeployment:
+    """Deploy Prometheus, scraping annotated pods and services, and Grafana.
+
+    Prometheus scrapes every `metricsScrapeInterval`, and keeps `metricsRetention` of samples.
+    Grafana is routed from the gateway as :py:data:`HOSTNAME`; anonymous users may view
+    the dashboards, editing them requires logging in.
+    """
+    ns = k8s.core.v1.Namespace("monitoring")
+    meta = k8s.meta.v1.ObjectMetaArgs(namespace = ns.metadata.name)
+
+    prometheus_meta = k8s.meta.v1.ObjectMetaArgs(
+        labels = { "app": "prometheus" }, **meta.__dict__,
+    )
+    prometheus = _prometheus(cfg, prometheus_meta, depends_on = depends_on)
+    prometheus_svc = _service("prometheus", prometheus_meta)
+
+    labels = { "app": "grafana" }
+    meta = k8s.meta.v1.ObjectMetaArgs(labels = labels, **meta.__dict__)
+    provisioning = k8s.core.v1.ConfigMap(
+        "grafana-provisioning",
+        metadata = meta,
+        data = {
+            "datasources.yaml": pulumi.Output.concat(
+                "http://", prometheus_svc.metadata.name, ".", ns.metadata.name, ".svc",
+            ).apply(lambda url: json.dumps({
+                "apiVersion": 1,
+                "datasources": [ {
+                    "name": "Prometheus",
+                    "uid": "prometheus",
+                    "type": "prometheus",
+                    "url": url,
+                    "isDefault": True,
+                } ],
+            })),
+            "dashboards.yaml": json.dumps({
+                "apiVersion": 1,
+                "providers": [ {
+                    "name": "default",
+                    "type": "file",
+                    "options": { "path": "/etc/grafana/dashboards" },
+                } ],
+            }),
+        },
+    )
+    dashboards = k8s.core.v1.ConfigMap(
+        "grafana-dashboards",
+        metadata = meta,
+        data = {
+            f"{(model := dashboard(title, panels, gw.implementation))['uid']}.json":
+                json.dumps(model)
+            for title, panels in DASHBOARDS.items()
+        },
+    )
+
+    grafana = k8s.apps.v1.Deployment(
+        "grafana",
+        metadata = meta,
+        opts = pulumi.ResourceOptions(depends_on = depends_on),
+        spec = k8s.apps.v1.DeploymentSpecArgs(
+            selector = k8s.meta.v1.LabelSelectorArgs(match_labels = labels),
+            template = k8s.core.v1.PodTemplateSpecArgs(
+                metadata = k8s.meta.v1.ObjectMetaArgs(labels = labels),
+                spec = k8s.core.v1.PodSpecArgs(
+                    containers = [ k8s.core.v1.ContainerArgs(
+                        name = "grafana",
+                        image = images.GRAFANA,
+                        image_pull_policy = "IfNotPresent",
+                        env = [
+                            k8s.core.v1.EnvVarArgs(name = name, value = value)
+                            for name, value in {
+                                "GF_AUTH_ANONYMOUS_ENABLED": "true",
+                                "GF_AUTH_ANONYMOUS_ORG_ROLE": "Viewer",
+                                "GF_ANALYTICS_REPORTING_ENABLED": "false",
+                                "GF_ANALYTICS_CHECK_FOR_UPDATES": "false",
+                            }.items()
+                        ],
+                        ports = [ k8s.core.v1.ContainerPortArgs(
+                            name = "http",
+                            container_port = 3000,
+                        ) ],
+                        readiness_probe = http_get("/api/health"),
+                        volume_mounts = [
+                            k8s.core.v1.VolumeMountArgs(
+                                name = "provisioning",
+                                mount_path = "/etc/grafana/provisioning",
+                                read_only = True,
+                            ),
+                            k8s.core.v1.VolumeMountArgs(
+                                name = "dashboards",
+                                mount_path = "/etc/grafana/dashboards",
+                                read_only = True,
+                            ),
+                        ],
+                    ) ],
+                    volumes = [
+                        k8s.core.v1.VolumeArgs(
+                            name = "provisioning",
+                            config_map = k8s.core.v1.ConfigMapVolumeSourceArgs(
+                                name = provisioning.metadata.name,
+                                items = [
+                                    k8s.core.v1.KeyToPathArgs(key = key, path = path)
+                                    for key, path in {
+                                        "datasources.yaml": "datasources/prometheus.yaml",
+                                        "dashboards.yaml": "dashboards/default.yaml",
+                                    }.items()
+                                ],
+                            ),
+                        ),
+                        k8s.core.v1.VolumeArgs(
+                            name = "dashboards",
+                            config_map = k8s.core.v1.ConfigMapVolumeSourceArgs(
+                                name = dashboards.metadata.name,
+                            ),
+                        ),
+                    ],
+                ),
+            ),
+        ),
+    )
+
+    route = gateway.http_route(
+        "grafana-route", gw,
+        metadata = meta,
+        hostnames = [ HOSTNAME ],
+        rules = [ {
+            "backendRefs": [ {
+                "name": _service("grafana", meta).metadata.name,
+                "port": 80,
+            } ],
+        } ],
+    )
+
+    return MetricsDeployment(prometheus, grafana, route)
+
+
+def _prometheus(
+    cfg: pulumi.Config,
+    meta: k8s.meta.v1.ObjectMetaArgs, *,
+    depends_on: Sequence[pulumi.Input[pulumi.Resource]],
+) -> k8s.apps.v1.Deployment:
+    """Deploy Prometheus, with a service account allowed to discover scrape targets."""
+    account = k8s.core.v1.ServiceAccount("prometheus", metadata = meta)
+    role = k8s.rbac.v1.ClusterRole(
+        "prometheus",
+        rules = [
+            k8s.rbac.v1.PolicyRuleArgs(
+                api_groups = [ "" ],
+                resources = [ "pods", "services", "endpoints" ],
+                verbs = [ "get", "list", "watch" ],
+            ),
+            k8s.rbac.v1.PolicyRuleArgs(
+                api_groups = [ "discovery.k8s.io" ],
+                resources = [ "endpointslices" ],
+                verbs = [ "get", "list", "watch" ],
+            ),
+        ],
+    )
+    k8s.rbac.v1.ClusterRoleBinding(
+        "prometheus",
+        role_ref = k8s.rbac.v1.RoleRefArgs(
+            api_group = "rbac.authorization.k8s.io",
+            kind = "ClusterRole",
+            name = role.metadata.name,
+        ),
+        subjects = [ k8s.rbac.v1.SubjectArgs(
+            kind = "ServiceAccount",
+            name = account.metadata.name,
+            namespace = meta.namespace,
+        ) ],
+    )
+
+    interval = cfg.get("metricsScrapeInterval") or "15s"
+    config = k8s.core.v1.ConfigMap(
+        "prometheus",
+        metadata = meta,
+        data = { "prometheus.yml": json.dumps({  # JSON is valid YAML
+            "global": { "scrape_interval": interval, "evaluation_interval": interval },
+            "scrape_configs": [
+                scrape_config("pod", "pod"),
+                scrape_config("endpointslice", "service"),
+            ],
+        }, indent = 2) },
+    )
+
+    return k8s.apps.v1.Deployment(
+        "prometheus",
+        metadata = meta,
+        opts = pulumi.ResourceOptions(depends_on = depends_on),
+        spec = k8s.apps.v1.DeploymentSpecArgs(
+            # a single replica, whose samples are lost when it is replaced
+            replicas = 1,
+            strategy = k8s.apps.v1.DeploymentStrategyArgs(type = "Recreate"),
+            selector = k8s.meta.v1.LabelSelectorArgs(match_labels = meta.labels),
+            template = k8s.core.v1.PodTemplateSpecArgs(
+                metadata = k8s.meta.v1.ObjectMetaArgs(labels = meta.labels),
+                spec = k8s.core.v1.PodSpecArgs(
+                    service_account_name = account.metadata.name,
+                    containers = [ k8s.core.v1.ContainerArgs(
+                        name = "prometheus",
+                        image = images.PROMETHEUS,
+                        image_pull_policy = "IfNotPresent",
+                        args = [
+                            "--config.file=/etc/prometheus/prometheus.yml",
+                            "--storage.tsdb.path=/prometheus",
+                            "--storage.tsdb.retention.time="
+                            + (cfg.get("metricsRetention") or "2d"),
+                        ],
+                        ports = [ k8s.core.v1.ContainerPortArgs(
+                            name = "http",
+                            container_port = 9090,
+                        ) ],
+                        readiness_probe = http_get("/-/ready"),
+                        volume_mounts = [
+                            k8s.core.v1.VolumeMountArgs(
+                                name = "config",
+                                mount_path = "/etc/prometheus",
+                                read_only = True,
+                            ),
+                            k8s.core.v1.VolumeMountArgs(name = "data", mount_path = "/prometheus"),
+                        ],
+                    ) ],
+                    volumes = [
+                        k8s.core.v1.VolumeArgs(
+                            name = "config",
+                            config_map = k8s.core.v1.ConfigMapVolumeSourceArgs(
+                                name = config.metadata.name,
+                            ),
+                        ),
+                        k8s.core.v1.VolumeArgs(
+                            name = "data",
+                            empty_dir = k8s.core.v1.EmptyDirVolumeSourceArgs(),
+                        ),
+                    ],
+                ),
+            ),
+        ),
+    )
+
+
+def _service(name: str, meta: k8s.meta.v1.ObjectMetaArgs) -> k8s.core.v1.Service:
+    """Expose the `http` port of the pods matching `meta`'s labels on port 80."""
+    return k8s.core.v1.Service(
+        name,
+        metadata = meta,
+        spec = k8s.core.v1.ServiceSpecArgs(
+            ports = [ k8s.core.v1.ServicePortArgs(port = 80, target_port = "http") ],
+            selector = meta.labels,
+        ),
+    )
@@ -0,0 +1,28 @@
+"""Set up `metrics-server`, serving the resource metrics API used by autoscalers.
+
+HorizontalPodAutoscalers scaling on CPU or memory utilization need it, and kind doesn't ship it.
+"""
+
+from collections.abc import Sequence
+from typing import Any
+
+import pulumi
+import pulumi_kubernetes as k8s
+
+import artifacts
+
+VALUES: dict[str, Any] = {
+    # kind's kubelets serve self-signed certificates
+    "args": [ "--kubelet-insecure-tls" ],
+}
+
+
+def deploy(depends_on: Sequence[pulumi.Input[pulumi.Resource]] = ()) -> k8s.helm.v4.Chart:
+    """Deploy `metrics-server` in `kube-system`."""
+    return k8s.helm.v4.Chart(
+        "metrics-server",
+        chart = str(artifacts.path(artifacts.METRICS_SERVER_CHART)),
+        namespace = "kube-system",
+        values = VALUES,
+        opts = pulumi.ResourceOptions(depends_on = depends_on),
+    )
@@ -0,0 +1,4 @@
+# noqa: D104
+from .registry import HOST_PATH, URL, OciCacheDeployment, deploy
+
+__all__ = ( "HOST_PATH", "URL", "OciCacheDeployment", "deploy" )
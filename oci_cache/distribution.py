@@ -0,0 +1,71 @@
+"""Minimal client for the OCI distribution API, as served by `ociregistry`.
+
+Shared by the scripts run next to the cache, using only the Python standard library.
+Requests use the `ns` query parameter to name the upstream registry, like `containerd` does,
+so they hit the same cache entries as image pulls.
+"""
+
+import json
+import os
+import urllib.parse
+import urllib.request
+from collections.abc import Iterator
+from http.client import HTTPResponse
+
+REGISTRY = os.environ.get("REGISTRY", "http://localhost:8080")
+
+MANIFEST_TYPES = ", ".join((
+    "application/vnd.oci.image.index.v1+json",
+    "application/vnd.oci.image.manifest.v1+json",
+    "application/vnd.docker.distribution.manifest.list.v2+json",
+    "application/vnd.docker.distribution.manifest.v2+json",
+))
+
+
+def parse(image: str) -> tuple[str, str, str]:
+    """Split a fully-qualified image reference into its registry, repository and tag."""
+    namespace, _, rest = image.partition("/")
+    repository, _, reference = rest.rpartition(":")
+    return namespace, repository, reference
+
+
+def get(namespace: str, repository: str, kind: str, reference: str) -> HTTPResponse:
+    """Request a manifest or blob from the cache."""
+    url = f"{REGISTRY}/v2/{repository}/{kind}/{reference}?" + urllib.parse.urlencode({
+        "ns": namespace,
+    })
+    request = urllib.request.Request(url, headers = { "Accept": MANIFEST_TYPES })  # noqa: S310
+    return urllib.request.urlopen(request, timeout = 300)  # noqa: S310
+
+
+def walk(
+    image: str,
+    platform: tuple[str, str] | None = None,
+) -> Iterator[tuple[str, str]]:
+    """Yield the `(kind, digest)` of an image's manifests and blobs, fetching its manifests.
+
+    Multi-platform images are restricted to `platform`, as `(os, architecture)`, if given.
+
+    Yields:
+        `("manifests", digest)` or `("blobs", digest)` tuples.
+
+    """
+    namespace, repository, reference = parse(image)
+    references = [ reference ]
+    while references:
+        with get(namespace, repository, "manifests", references.pop()) as response:
+            if digest := response.headers.get("Docker-Content-Digest"):
+                yield "manifests", digest
+            manifest = json.load(response)
+
+        references.extend(
+            child["digest"]
+            for child in manifest.get("manifests", ())
+            if platform is None or platform == (
+                child.get("platform", {}).get("os"),
+                child.get("platform", {}).get("architecture"),
+            )
+        )
+        for blob in (manifest.get("config"), *manifest.get("layers", ())):
+            if blob:
+                yield "blobs", blob["digest"]
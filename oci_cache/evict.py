@@ -0,0 +1,316 @@
+"""Evict least-recently used images from an `ociregistry` cache, once its volume fills up.
+
+Runs as a sidecar to `ociregistry`, using only the Python standard library:
+- when the volume's usage exceeds `HIGH_WATERMARK` percent, whole images are removed by order
+  of last access (or modification, whichever is later) to their manifest or blobs, until it
+  drops under `LOW_WATERMARK`: `ociregistry` serves an image's blobs from disk once it has its
+  manifest, so the manifest is removed first, then the blobs no remaining manifest mentions ;
+- blobs no manifest mentions are evicted first, least-recently used first ;
+- the images listed in `PROTECTED` are never evicted ;
+- cache size and eviction counters are exposed in Prometheus' text format on `METRICS_PORT`,
+  as well as hits and misses, counted from the volume's `inotify` events: a blob written to
+  the cache is a miss, pulled from upstream, and a blob read from it is a hit; as the kernel
+  coalesces identical consecutive events, hits are a lower bound under load.
+
+Last access times are only as precise as the volume's mount options (`relatime` by default)
+allow; this is plenty to tell cold layers from the ones in use.
+"""
+
+import ctypes
+import http.server
+import logging
+import os
+import re
+import struct
+import threading
+import time
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+
+import distribution
+
+CACHE_DIR = Path(os.environ.get("CACHE_DIR", "/var/lib/ociregistry"))
+PROTECTED = Path(os.environ.get("PROTECTED", "/etc/oci-cache/images"))
+HIGH_WATERMARK = int(os.environ.get("HIGH_WATERMARK", "85"))
+LOW_WATERMARK = int(os.environ.get("LOW_WATERMARK", "70"))
+INTERVAL = int(os.environ.get("INTERVAL", "60"))
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9102"))
+
+# inotify(7) event masks
+IN_CLOSE_WRITE = 0x08
+IN_CLOSE_NOWRITE = 0x10
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_ISDIR = 0x40000000
+EVENT = struct.Struct("iIII")
+
+log = logging.getLogger("evictor")
+metrics = {
+    "oci_cache_size_bytes": 0,
+    "oci_cache_capacity_bytes": 0,
+    "oci_cache_blobs": 0,
+    "oci_cache_evictions_total": 0,
+    "oci_cache_evicted_bytes_total": 0,
+    "oci_cache_hits_total": 0,
+    "oci_cache_misses_total": 0,
+    "oci_cache_served_bytes_total": 0,
+    "oci_cache_fetched_bytes_total": 0,
+}
+
+
+def usage() -> tuple[int, int]:
+    """Return the used and total bytes of the cache's volume."""
+    st = os.statvfs(CACHE_DIR)
+    return (st.f_blocks - st.f_bfree) * st.f_frsize, st.f_blocks * st.f_frsize
+
+
+DIGEST = re.compile(r"sha256:([0-9a-f]{64})")
+HEX_DIGEST = re.compile(r"[0-9a-f]{64}")
+
+
+@dataclass(frozen = True, slots = True)
+class Manifest:
+    """A cached manifest, with the hex digests it mentions, including its own if in its name."""
+
+    path: Path
+    text: str
+    digests: frozenset[str]
+    last_use: float
+    """Last use before the evictor read it."""
+
+
+def last_use(path: Path) -> float:
+    """Get the time a file was last read or written."""
+    st = path.stat()
+    return max(st.st_atime, st.st_mtime)
+
+
+def manifests() -> list[Manifest]:
+    """Read the cached manifests, i.e. all files but blobs."""
+    found = []
+    for path in CACHE_DIR.rglob("*"):
+        if is_blob(path) or not path.is_file():
+            continue
+        try:
+            st = path.stat()
+            text = f"{path.name}\n{path.read_text(encoding = 'utf-8')}"
+            # restore the access time, so the next rounds still see when the image was used
+            os.utime(path, ns = (st.st_atime_ns, st.st_mtime_ns))
+        except (OSError, UnicodeDecodeError):
+            continue
+        found.append(Manifest(path, text, frozenset(
+            DIGEST.findall(text) + HEX_DIGEST.findall(path.name),
+        ), max(st.st_atime, st.st_mtime)))
+
+    return found
+
+
+def protected_digests(cached: list[Manifest]) -> set[str]:
+    """Find the hex digests of all parts of the protected images among `cached` manifests.
+
+    They are read from the manifests on disk: resolving the images through the registry
+    would pull in every platform of those it misses, just as the volume is filling up.
+    A manifest is protected if it mentions a protected image's `repository:tag`, or
+    `repository@digest` with the digest of a protected part, e.g. a platform's manifest
+    listed in a protected image index.
+    """
+    images = PROTECTED.read_text(encoding = "utf-8").split() if PROTECTED.exists() else ()
+    protected: set[str] = set()
+    for _, repository, tag in map(distribution.parse, images):
+        references = { f"{repository}:{tag}" }
+        while matches := [
+            manifest.digests
+            for manifest in cached
+            if not manifest.digests <= protected
+            and any(ref in manifest.text for ref in references)
+        ]:
+            protected.update(*matches)
+            references.update(f"{repository}@sha256:{digest}" for digest in protected)
+
+    return protected
+
+
+def blobs() -> dict[str, Path]:
+    """Find the cached blobs, by hex digest."""
+    return {
+        match[0]: path
+        for path in CACHE_DIR.rglob("*")
+        if is_blob(path) and path.is_file() and (match := HEX_DIGEST.search(path.name))
+    }
+
+
+def least_recently_used(
+    cached: list[Manifest], cached_blobs: dict[str, Path], protected: set[str],
+) -> list[Manifest]:
+    """Order the unprotected manifests by last use of the image, i.e. of their most recent part."""
+    return sorted(
+        ( manifest for manifest in cached if not manifest.digests <= protected ),
+        key = lambda manifest: max((
+            manifest.last_use,
+            *(last_use(cached_blobs[d]) for d in manifest.digests if d in cached_blobs),
+        )),
+    )
+
+
+def remove(path: Path) -> int:
+    """Evict a cached file, and return its size, or 0 if it was removed already."""
+    if (removed := size(path)) is None:
+        return 0
+    log.info("evicting %s (%d bytes)", path, removed)
+    path.unlink(missing_ok = True)
+    metrics["oci_cache_evicted_bytes_total"] += removed
+    return removed
+
+
+def evict() -> None:
+    """Evict images until the volume's usage is under the low watermark."""
+    used, total = usage()
+    cached_blobs = blobs()
+    metrics.update(
+        oci_cache_size_bytes = used,
+        oci_cache_capacity_bytes = total,
+        oci_cache_blobs = len(cached_blobs),
+    )
+    if used * 100 < total * HIGH_WATERMARK:
+        return
+
+    cached = manifests()
+    protected = protected_digests(cached)
+    target = total * LOW_WATERMARK // 100
+
+    mentioned = set().union(*(manifest.digests for manifest in cached))
+    for path in sorted(
+        ( path for digest, path in cached_blobs.items() if digest not in mentioned ),
+        key = last_use,
+    ):
+        if used <= target:
+            break
+        used -= remove(path)
+
+    remaining = set(cached)
+    for manifest in least_recently_used(cached, cached_blobs, protected):
+        if used <= target:
+            break
+        # the manifest first, so the image isn't served with missing blobs
+        used -= remove(manifest.path)
+        remaining.discard(manifest)
+        metrics["oci_cache_evictions_total"] += 1
+
+        unused = manifest.digests - protected.union(*(other.digests for other in remaining))
+        used -= sum(remove(cached_blobs.pop(digest)) for digest in unused & cached_blobs.keys())
+
+    if used > target:
+        log.warning("cache still above its low watermark, after evicting all unprotected images")
+    metrics.update(oci_cache_size_bytes = usage()[0], oci_cache_blobs = len(blobs()))
+
+
+def is_blob(path: Path) -> bool:
+    """Tell whether a path in the cache is a blob."""
+    return "blobs" in path.relative_to(CACHE_DIR).parts[:-1]
+
+
+def size(path: Path) -> int | None:
+    """Get a file's size, or `None` if it was removed already."""
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return None
+
+
+def parse(buffer: bytes) -> Iterator[tuple[int, int, str]]:
+    """Decode the `inotify` events read at once, as `(wd, mask, name)`.
+
+    Yields:
+        `(wd, mask, name)` of each event.
+
+    """
+    offset = 0
+    while offset < len(buffer):
+        wd, mask, _, length = EVENT.unpack_from(buffer, offset)
+        name = buffer[offset + EVENT.size:offset + EVENT.size + length].rstrip(b"\0")
+        offset += EVENT.size + length
+        yield wd, mask, os.fsdecode(name)
+
+
+def events() -> Iterator[tuple[int, Path]]:
+    """Watch the cache's directories, including new ones, for files being created, written or read.
+
+    Yields:
+        `(mask, path)` of each file event.
+
+    Raises:
+        OSError: if `inotify` isn't available.
+
+    """
+    libc = ctypes.CDLL(None, use_errno = True)
+    fd = libc.inotify_init1(os.O_CLOEXEC)
+    if fd < 0:
+        raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    directories: dict[int, Path] = {}
+
+    def watch(tree: Path) -> None:
+        # subdirectories may have been created before the watch on their parent was
+        mask = IN_CLOSE_WRITE | IN_CLOSE_NOWRITE | IN_MOVED_TO | IN_CREATE
+        for directory in filter(Path.is_dir, ( tree, *tree.rglob("*") )):
+            if (wd := libc.inotify_add_watch(fd, os.fsencode(directory), mask)) >= 0:
+                directories[wd] = directory
+
+    watch(CACHE_DIR)
+
+    while buffer := os.read(fd, 1 << 16):
+        for wd, mask, name in parse(buffer):
+            path = directories.get(wd, CACHE_DIR) / name
+            if not mask & IN_ISDIR:
+                yield mask, path
+            elif mask & (IN_CREATE | IN_MOVED_TO):
+                watch(path)
+
+
+def count_accesses() -> None:
+    """Count blobs written to the cache as misses, and blobs read from it as hits."""
+    for mask, path in events():
+        if not is_blob(path) or (blob_size := size(path)) is None:
+            continue
+        if mask & IN_CLOSE_NOWRITE:
+            metrics["oci_cache_hits_total"] += 1
+            metrics["oci_cache_served_bytes_total"] += blob_size
+        elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+            metrics["oci_cache_misses_total"] += 1
+            metrics["oci_cache_fetched_bytes_total"] += blob_size
+
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    """Serve the metrics in Prometheus' text exposition format."""
+
+    def do_GET(self) -> None:
+        """Handle a scrape."""
+        body = "".join(
+            f"# TYPE {name} {'counter' if name.endswith('_total') else 'gauge'}\n{name} {value}\n"
+            for name, value in metrics.items()
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main() -> None:
+    """Check the cache's size every `INTERVAL` seconds, and evict blobs as needed."""
+    logging.basicConfig(level = logging.INFO)
+    server = http.server.ThreadingHTTPServer(("", METRICS_PORT), MetricsHandler)
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+    threading.Thread(target = count_accesses, daemon = True).start()
+
+    while True:
+        try:
+            evict()
+        except OSError:
+            log.exception("eviction failed")
+        time.sleep(INTERVAL)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,409 @@
+"""A caching, pull-through OCI image cache.
+
+`ociregistry` requires neither changes to image URLs, nor per-registry configuration,
+making it the lowest-touch option I could find.
+
+`containerd` is configured to use the registry through `registry.d/_default/hosts.toml`,
+which `cluster.py` renders along with `kind-config.yaml`.
+"""
+
+import importlib.resources
+from collections.abc import Sequence
+
+import pulumi
+import pulumi_kubernetes as k8s
+
+import images
+import preload
+from component import Component
+from utils import http_get
+
+NAMESPACE = "oci-cache"
+SERVICE = "oci-cache"
+URL = f"http://{SERVICE}.{NAMESPACE}.svc.cluster.local"
+"""Address `containerd` pulls images through, see `cluster.py`."""
+HOST_PATH = "/var/lib/oci-cache"
+"""Nodes' directory storing shards with `host` persistence, mounted from `oci-cache.d`."""
+
+
+class OciCacheDeployment(Component):
+    """The OCI cache, as a component resource."""
+
+    registry: k8s.apps.v1.StatefulSet
+    """Cache shards, ready once all of them are."""
+    service: k8s.core.v1.Service
+    """Service used by `containerd`, ready once it has endpoints, i.e. can serve pulls."""
+
+
+def deploy(  # noqa: PLR0914
+    cfg: pulumi.Config, *,
+    depends_on: Sequence[pulumi.Input[pulumi.Resource]] = (),
+) -> OciCacheDeployment:
+    """Deploy `ociregistry`.
+
+    The cache is split in `ociCacheShards` replicas, each with its own persistent volume.
+    When there are several, a router sends all requests for a repository to the same shard:
+    `ociregistry` pulls a whole image through when its manifest is requested, and serves its
+    blobs from there, so they must be asked from that shard. Layers shared across repositories
+    may thus be cached on several shards.
+
+    Each shard evicts its least-recently used images once its volume is filled over
+    `ociCacheHighWatermark` percent, down to `ociCacheLowWatermark`; see `evict.py`.
+    Images deployed by this program are never evicted, including those of its Helm charts,
+    listed by :py:func:`preload.inventory`; rendering charts requires `helm`.
+
+    With `ociCachePersistence` set to `host`, shards are stored on the nodes' :py:data:`HOST_PATH`,
+    which `kind-config.yaml` mounts from the host's `oci-cache.d`: the cache then survives
+    cluster re-creation, and the watermarks apply to the host's filesystem.
+    In any case, a Job pre-warms the cache with all images the program deploys, charts' included.
+
+    Raises:
+        ValueError: if the watermarks or persistence mode are invalid.
+
+    """
+    shards = cfg.get_int("ociCacheShards") or 1
+    high_watermark = cfg.get_int("ociCacheHighWatermark") or 85
+    low_watermark = cfg.get_int("ociCacheLowWatermark") or 70
+    if not 0 < low_watermark < high_watermark <= 100:  # noqa: PLR2004
+        msg = "OCI cache watermarks must verify 0 < low < high <= 100"
+        raise ValueError(msg)
+    persistence = cfg.get("ociCachePersistence") or "volume"
+    if persistence not in { "volume", "host" }:
+        msg = f"unknown OCI cache persistence mode {persistence!r}"
+        raise ValueError(msg)
+
+    component = OciCacheDeployment("oci-cache")
+    ns = k8s.core.v1.Namespace(
+        NAMESPACE,
+        # don't use automatic naming, as the containerd config depends on the name
+        metadata = k8s.meta.v1.ObjectMetaArgs(name = NAMESPACE),
+        opts = component.child(),
+    )
+
+    labels = { "app": "oci-cache" }
+    meta = k8s.meta.v1.ObjectMetaArgs(
+        namespace = ns.metadata.name,
+        labels = labels,
+    )
+
+    # Headless service, giving each shard a stable DNS name
+    shards_svc = k8s.core.v1.Service(
+        "ociregistry",
+        # don't use automatic naming, as the router config depends on the name
+        metadata = k8s.meta.v1.ObjectMetaArgs(name = "ociregistry", **meta.__dict__),
+        opts = component.child(),
+        spec = k8s.core.v1.ServiceSpecArgs(
+            cluster_ip = "None",
+            publish_not_ready_addresses = True,
+            ports = [ k8s.core.v1.ServicePortArgs(
+                name = "http",
+                port = 8080,
+                target_port = "http",
+            ) ],
+            selector = labels,
+        ),
+    )
+
+    # all images the program deploys, including those of the charts
+    inventory = sorted(preload.inventory())
+    scripts_volume, scripts_mount = _scripts(component, meta, inventory)
+
+    # with host persistence, each shard gets its own subdirectory of the node's volume
+    images_mount = k8s.core.v1.VolumeMountArgs(
+        name = "images",
+        mount_path = "/var/lib/ociregistry",
+        sub_path_expr = "$(POD_NAME)" if persistence == "host" else None,
+    )
+    pod_name = k8s.core.v1.EnvVarArgs(
+        name = "POD_NAME",
+        value_from = k8s.core.v1.EnvVarSourceArgs(
+            field_ref = k8s.core.v1.ObjectFieldSelectorArgs(field_path = "metadata.name"),
+        ),
+    )
+
+    # TODO: setup mTLS between containerd and ociregistry?
+    sts = k8s.apps.v1.StatefulSet(
+        "ociregistry",
+        # don't use automatic naming, as the router selects shards by pod name
+        metadata = k8s.meta.v1.ObjectMetaArgs(name = "ociregistry", **meta.__dict__),
+        opts = component.child(depends_on = depends_on),
+        spec = k8s.apps.v1.StatefulSetSpecArgs(
+            replicas = shards,
+            service_name = shards_svc.metadata.name,
+            # shards are independent, no need to start them one at a time
+            pod_management_policy = "Parallel",
+            selector = k8s.meta.v1.LabelSelectorArgs(match_labels = labels),
+            template = k8s.core.v1.PodTemplateSpecArgs(
+                metadata = k8s.meta.v1.ObjectMetaArgs(
+                    labels = labels,
+                    annotations = {
+                        "prometheus.io/scrape": "true",
+                        "prometheus.io/port": "9102",
+                    },
+                ),
+                spec = k8s.core.v1.PodSpecArgs(
+                    containers = [ k8s.core.v1.ContainerArgs(
+                        name = "ociregistry",
+                        image = images.OCIREGISTRY,
+                        ports = [ k8s.core.v1.ContainerPortArgs(
+                            name = "http",
+                            container_port = 8080,
+                        ) ],
+                        liveness_probe = http_get("/health"),
+                        readiness_probe = http_get("/health"),
+                        env = [ pod_name ],
+                        volume_mounts = [ images_mount ],
+                    ), k8s.core.v1.ContainerArgs(
+                        name = "evictor",
+                        image = images.PYTHON,
+                        image_pull_policy = "IfNotPresent",
+                        args = [ "python", "/etc/oci-cache/evict.py" ],
+                        env = [ pod_name ] + [
+                            k8s.core.v1.EnvVarArgs(name = name, value = str(value))
+                            for name, value in {
+                                "HIGH_WATERMARK": high_watermark,
+                                "LOW_WATERMARK": low_watermark,
+                                "METRICS_PORT": 9102,
+                            }.items()
+                        ],
+                        ports = [ k8s.core.v1.ContainerPortArgs(
+                            name = "metrics",
+                            container_port = 9102,
+                        ) ],
+                        volume_mounts = [ images_mount, scripts_mount ],
+                    ) ],
+                    volumes = [ scripts_volume ] + ([ k8s.core.v1.VolumeArgs(
+                        name = "images",
+                        host_path = k8s.core.v1.HostPathVolumeSourceArgs(
+                            path = HOST_PATH,
+                            type = "DirectoryOrCreate",
+                        ),
+                    ) ] if persistence == "host" else []),
+                ),
+            ),
+            volume_claim_templates = [ k8s.core.v1.PersistentVolumeClaimArgs(
+                metadata = k8s.meta.v1.ObjectMetaArgs(name = "images"),
+                spec = {
+                    "access_modes": ("ReadWriteOncePod", ),
+                    "storage_class_name": cfg.get("ociCacheStorageClass") or None,
+                    "resources": {
+                        "requests": { "storage": cfg.get("ociCacheSize") or "2Gi" },
+                    },
+                },
+            ) ] if persistence == "volume" else [],
+        ),
+    )
+
+    if shards > 1:
+        labels = { "app": "oci-cache-router" }
+        meta = k8s.meta.v1.ObjectMetaArgs(namespace = ns.metadata.name, labels = labels)
+        _router(component, meta, shards, depends_on = ( shards_svc, *depends_on ))
+
+    svc = k8s.core.v1.Service(
+        SERVICE,
+        # don't use automatic naming, as the containerd config depends on the name
+        # FIXME find official API surface for this
+        metadata = k8s.meta.v1.ObjectMetaArgs(name = SERVICE, **meta.__dict__),
+        opts = component.child(),
+        spec = k8s.core.v1.ServiceSpecArgs(
+            type = "ClusterIP",
+            ports = [ k8s.core.v1.ServicePortArgs(
+                port = 80,
+                target_port = "http",
+            ) ],
+            selector = labels,
+        ),
+    )
+
+    _prewarm(
+        component,
+        k8s.meta.v1.ObjectMetaArgs(
+            namespace = ns.metadata.name,
+            labels = { "app": "oci-cache-warm" },
+        ),
+        scripts_volume, scripts_mount, inventory,
+        depends_on = ( sts, svc ),
+    )
+
+    component.register(registry = sts, service = svc)
+    return component
+
+
+def _scripts(
+    component: Component,
+    meta: k8s.meta.v1.ObjectMetaArgs,
+    inventory: Sequence[str],
+) -> tuple[k8s.core.v1.VolumeArgs, k8s.core.v1.VolumeMountArgs]:
+    """Ship the scripts run next to the cache, and the `inventory` of images it should hold."""
+    scripts = k8s.core.v1.ConfigMap(
+        "oci-cache-scripts",
+        metadata = meta,
+        opts = component.child(),
+        data = {
+            script: (importlib.resources.files(__package__) / script).read_text()
+            for script in ( "distribution.py", "evict.py", "warm.py" )
+        } | {
+            "images": "\n".join(inventory) + "\n",
+        },
+    )
+
+    return (
+        k8s.core.v1.VolumeArgs(
+            name = "scripts",
+            config_map = k8s.core.v1.ConfigMapVolumeSourceArgs(name = scripts.metadata.name),
+        ),
+        k8s.core.v1.VolumeMountArgs(
+            name = "scripts",
+            mount_path = "/etc/oci-cache",
+            read_only = True,
+        ),
+    )
+
+
+def _prewarm(  # noqa: PLR0913
+    component: Component,
+    meta: k8s.meta.v1.ObjectMetaArgs,
+    scripts_volume: k8s.core.v1.VolumeArgs,
+    scripts_mount: k8s.core.v1.VolumeMountArgs,
+    inventory: Sequence[str], *,
+    depends_on: Sequence[pulumi.Input[pulumi.Resource]],
+) -> k8s.batch.v1.Job:
+    """Pull the `inventory` of images, as shipped by :py:func:`_scripts`, through the cache.
+
+    Each index of the Job pulls one image, all in parallel.
+
+    The Job runs in the background, `pulumi up` doesn't wait for its completion.
+    """
+    return k8s.batch.v1.Job(
+        "oci-cache-warm",
+        metadata = k8s.meta.v1.ObjectMetaArgs(
+            annotations = { "pulumi.com/skipAwait": "true" },
+            **meta.__dict__,
+        ),
+        opts = component.child(depends_on = depends_on),
+        spec = k8s.batch.v1.JobSpecArgs(
+            completion_mode = "Indexed",
+            completions = len(inventory),
+            parallelism = len(inventory),
+            backoff_limit_per_index = 2,
+            max_failed_indexes = len(inventory),
+            template = k8s.core.v1.PodTemplateSpecArgs(
+                metadata = k8s.meta.v1.ObjectMetaArgs(labels = meta.labels),
+                spec = k8s.core.v1.PodSpecArgs(
+                    restart_policy = "Never",
+                    containers = [ k8s.core.v1.ContainerArgs(
+                        name = "warm",
+                        image = images.PYTHON,
+                        image_pull_policy = "IfNotPresent",
+                        args = [ "python", "/etc/oci-cache/warm.py" ],
+                        env = [ k8s.core.v1.EnvVarArgs(
+                            name = "REGISTRY",
+                            value = URL,
+                        ) ],
+                        volume_mounts = [ scripts_mount ],
+                    ) ],
+                    volumes = [ scripts_volume ],
+                ),
+            ),
+        ),
+    )
+
+
+def _router(
+    component: Component,
+    meta: k8s.meta.v1.ObjectMetaArgs,
+    shards: int, *,
+    depends_on: Sequence[pulumi.Input[pulumi.Resource]],
+) -> k8s.apps.v1.Deployment:
+    """Deploy an Nginx reverse-proxy, sending requests to a shard based on the repository.
+
+    Consistent hashing keeps most repositories on the same shard when the number of shards
+    changes. Each shard gets its own ClusterIP Service: Nginx only resolves upstream servers
+    at startup, and a Service's address, unlike a pod's, survives the shard's restarts.
+    """
+    shard_svcs = [
+        k8s.core.v1.Service(
+            f"ociregistry-{i}",
+            # don't use automatic naming, as the router config depends on the name
+            metadata = k8s.meta.v1.ObjectMetaArgs(
+                name = f"ociregistry-{i}",
+                namespace = meta.namespace,
+                labels = { "app": "oci-cache" },
+            ),
+            opts = component.child(),
+            spec = k8s.core.v1.ServiceSpecArgs(
+                ports = [ k8s.core.v1.ServicePortArgs(port = 8080, target_port = "http") ],
+                selector = { "statefulset.kubernetes.io/pod-name": f"ociregistry-{i}" },
+            ),
+        )
+        for i in range(shards)
+    ]
+
+    config = k8s.core.v1.ConfigMap(
+        "oci-cache-router",
+        metadata = meta,
+        opts = component.child(),
+        data = { "default.conf": "\n".join((
+            # route an image's manifests and blobs alike, by upstream registry and repository
+            "map $uri $repository {",
+            "    ~^/v2/(?<name>.+)/(?:manifests|blobs)/ $name;",
+            "    default $uri;",
+            "}",
+            "upstream ociregistry {",
+            "    hash $arg_ns/$repository consistent;",
+            *(
+                f"    server ociregistry-{i}.{NAMESPACE}.svc.cluster.local:8080;"
+                for i in range(shards)
+            ),
+            "    keepalive 32;",
+            "}",
+            "server {",
+            "    listen 8080;",
+            "    client_max_body_size 0;",
+            "    proxy_buffering off;",  # stream layers as they are pulled from upstream
+            "    proxy_read_timeout 600s;",
+            "    location / {",
+            "        proxy_pass http://ociregistry;",
+            "        proxy_http_version 1.1;",
+            '        proxy_set_header Connection "";',
+            "        proxy_set_header Host $host;",
+            "    }",
+            "}",
+        )) + "\n" },
+    )
+
+    return k8s.apps.v1.Deployment(
+        "oci-cache-router",
+        metadata = meta,
+        opts = component.child(depends_on = [ *shard_svcs, *depends_on ]),
+        spec = k8s.apps.v1.DeploymentSpecArgs(
+            replicas = 2,  # stateless, a second replica avoids stalling pulls during updates
+            selector = k8s.meta.v1.LabelSelectorArgs(match_labels = meta.labels),
+            template = k8s.core.v1.PodTemplateSpecArgs(
+                metadata = k8s.meta.v1.ObjectMetaArgs(labels = meta.labels),
+                spec = k8s.core.v1.PodSpecArgs(
+                    containers = [ k8s.core.v1.ContainerArgs(
+                        name = "nginx",
+                        image = images.NGINX,
+                        image_pull_policy = "IfNotPresent",
+                        ports = [ k8s.core.v1.ContainerPortArgs(
+                            name = "http",
+                            container_port = 8080,
+                        ) ],
+                        readiness_probe = http_get("/health"),
+                        volume_mounts = [ k8s.core.v1.VolumeMountArgs(
+                            name = "config",
+                            mount_path = "/etc/nginx/conf.d",
+                            read_only = True,
+                        ) ],
+                    ) ],
+                    volumes = [ k8s.core.v1.VolumeArgs(
+                        name = "config",
+                        config_map = k8s.core.v1.ConfigMapVolumeSourceArgs(
+                            name = config.metadata.name,
+                        ),
+                    ) ],
+                ),
+            ),
+        ),
+    )
@@ -0,0 +1,40 @@
+"""Pre-warm the OCI cache with one of the images listed in `IMAGES`.
+
+Runs as an indexed Job, each completion pulling the image at its `JOB_COMPLETION_INDEX`
+through the cache for the node's platform, so the whole list is fetched in parallel.
+"""
+
+import logging
+import os
+import platform
+from pathlib import Path
+
+import distribution
+
+IMAGES = Path(os.environ.get("IMAGES", "/etc/oci-cache/images"))
+ARCHITECTURES = { "x86_64": "amd64", "aarch64": "arm64" }
+
+log = logging.getLogger("warm")
+
+
+def main() -> None:
+    """Pull an image's manifests and blobs through the cache, discarding them."""
+    logging.basicConfig(level = logging.INFO)
+    images = IMAGES.read_text(encoding = "utf-8").split()
+    image = images[int(os.environ["JOB_COMPLETION_INDEX"])]
+    namespace, repository, _ = distribution.parse(image)
+    node_platform = ("linux", ARCHITECTURES.get(platform.machine(), platform.machine()))
+
+    size = 0
+    for kind, digest in distribution.walk(image, node_platform):
+        if kind != "blobs":
+            continue
+        with distribution.get(namespace, repository, kind, digest) as response:
+            while chunk := response.read(1 << 20):
+                size += len(chunk)
+
+    log.info("warmed %s (%d bytes)", image, size)
+
+
+if __name__ == "__main__":
+    main()
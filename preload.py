@@ -0,0 +1,141 @@
+"""Pre-load all container images the program deploys into a kind cluster's nodes.
+
+Images come from :py:mod:`images`, and from rendering the Helm charts the program installs.
+They are pulled and loaded concurrently; images which all nodes already have are skipped.
+
+Usage: `python preload.py [--name CLUSTER] [--jobs N] [--dry-run]`
+"""
+
+import argparse
+import json
+import logging
+import subprocess  # noqa: S404
+import typing
+from collections.abc import Iterator, Mapping
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+import yaml
+
+import artifacts
+import cilium
+import images
+import metrics_server
+
+log = logging.getLogger("preload")
+
+
+def _run(*args: str, stdin: str | None = None) -> str:
+    return subprocess.run(  # noqa: S603
+        args, input = stdin, capture_output = True, check = True, text = True,
+    ).stdout
+
+
+def _containers_images(obj: Any) -> Iterator[str]:  # noqa: ANN401
+    """Find the images of all containers in a (rendered) Kubernetes object.
+
+    Yields:
+        container images, possibly with duplicates.
+
+    """
+    if isinstance(obj, Mapping):
+        for key, value in obj.items():
+            if key in { "containers", "initContainers" }:
+                yield from (container["image"] for container in value)
+            else:
+                yield from _containers_images(value)
+    elif isinstance(obj, list):
+        for value in obj:
+            yield from _containers_images(value)
+
+
+def chart_images(chart: artifacts.Artifact, values: Mapping[str, Any]) -> set[str]:
+    """Render a Helm chart and list the images it deploys, or none if it cannot be rendered."""
+    try:
+        rendered = _run(
+            "helm", "template", str(artifacts.path(chart)), "--values", "-",
+            stdin = json.dumps(values),
+        )
+    except (OSError, subprocess.CalledProcessError, artifacts.ArtifactError) as e:
+        log.warning("could not render chart %s: %s", chart.key, getattr(e, "stderr", e))
+        return set()
+
+    return set(_containers_images(list(yaml.safe_load_all(rendered))))
+
+
+def inventory() -> set[str]:
+    """List all images deployed by the program, including those from Helm charts.
+
+    Cilium's chart is rendered with all features enabled, to get a superset of its images.
+    Digests are dropped, as `kind load` only preserves tags; the program references
+    Cilium's images by tag accordingly, see :py:func:`cilium.values`.
+    """
+    found = set(images.ALL).union(
+        chart_images(artifacts.CILIUM_CHART, cilium.values(
+            "localhost", "6443", set(typing.get_args(cilium.Feature)),
+        )),
+        chart_images(artifacts.METRICS_SERVER_CHART, metrics_server.VALUES),
+        chart_images(artifacts.NGINX_GATEWAY_FABRIC_CHART, {}),
+    )
+
+    return { image.partition("@")[0] for image in found }
+
+
+def node_images(cluster: str) -> dict[str, set[str]]:
+    """List the images present on each of a kind cluster's nodes."""
+    return {
+        node: {
+            tag
+            for image in json.loads(_run("docker", "exec", node, "crictl", "images", "-o=json"))[
+                "images"
+            ]
+            for tag in image.get("repoTags") or ()
+        }
+        for node in _run("kind", "get", "nodes", "--name", cluster).split()
+    }
+
+
+def preload(image: str, cluster: str, nodes: list[str]) -> None:
+    """Pull an image on the host if needed, and load it into the given nodes."""
+    try:
+        _run("docker", "image", "inspect", image)
+    except subprocess.CalledProcessError:
+        log.info("pulling %s", image)
+        _run("docker", "pull", image)
+
+    log.info("loading %s into %s", image, ", ".join(nodes))
+    _run("kind", "load", "docker-image", image, "--name", cluster, "--nodes", ",".join(nodes))
+
+
+def main() -> None:
+    """Pre-load missing images into the cluster's nodes, with a bounded pool of workers."""
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument("--name", default = "kind", help = "name of the kind cluster")
+    parser.add_argument("-j", "--jobs", type = int, default = 4, help = "concurrent pulls/loads")
+    parser.add_argument("--dry-run", action = "store_true", help = "only list missing images")
+    args = parser.parse_args()
+    logging.basicConfig(level = logging.INFO, format = "%(message)s")
+
+    wanted = sorted(inventory())
+    present = node_images(args.name)
+    missing = {
+        image: nodes
+        for image in wanted
+        if (nodes := [ node for node, tags in present.items() if image not in tags ])
+    }
+    if args.dry_run:
+        for image, nodes in missing.items():
+            log.info("%s: missing on %s", image, ", ".join(nodes))
+        return
+
+    with ThreadPoolExecutor(max_workers = args.jobs) as pool:
+        for future in [
+            pool.submit(preload, image, args.name, nodes) for image, nodes in missing.items()
+        ]:
+            future.result()
+
+    log.info("%d image(s) loaded, %d already present", len(missing), len(wanted) - len(missing))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Profile where the program's startup goes.
+
+The program is run offline, with the tests' mocked resources: this reports
+the time spent importing modules, by package and API group version, and running the program;
+artifacts aren't read. For a function-level profile, use
+`python -m cProfile -s tottime startup.py --run`.
+
+Usage: `python startup.py [--top N] [--repeat N] [--config KEY=VALUE ...]`
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import logging
+import operator
+import re
+import runpy
+import subprocess  # noqa: S404
+import sys
+import time
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any
+
+import pulumi
+from pulumi.runtime.stack import wait_for_rpcs
+
+import artifacts
+from tests.mocks import PROJECT, Mocks, config
+
+ROOT = Path(__file__).parent
+
+log = logging.getLogger("startup")
+
+
+def run(overrides: Mapping[str, str]) -> dict[str, Any]:
+    """Run the program with mocked resources.
+
+    Returns its wall time, and the number of resources it registered.
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    mocks = Mocks()
+    pulumi.runtime.set_mocks(mocks, project = PROJECT, stack = "profile", preview = False)
+    pulumi.runtime.set_all_config(config({ "k8sEndpoint": "127.0.0.1:6443", **overrides }))
+    # placeholders, never read: mocked charts and manifests aren't rendered
+    artifacts.path = lambda artifact: ROOT / ".artifacts" / artifact.filename
+
+    start = time.perf_counter()
+    runpy.run_path(str(ROOT / "__main__.py"), run_name = "__main__")
+    loop.run_until_complete(wait_for_rpcs())
+    return { "wall_time": time.perf_counter() - start, "resources": mocks.resources }
+
+
+def import_times(stderr: str) -> collections.Counter[str]:
+    """Sum `-X importtime`'s self times, in seconds, by package or API group version."""
+    times = collections.Counter[str]()
+    for match in re.finditer(r"^import time:\s+(\d+) \|\s+\d+ \|\s*(\S+)$", stderr, re.MULTILINE):
+        module = match[2].split(".")
+        group = ".".join(module[:3] if module[0] == "pulumi_kubernetes" else module[:1])
+        times[group] += int(match[1]) / 1e6
+    return times
+
+
+def main() -> None:
+    """Profile the program's startup in fresh interpreters, and report the median run."""
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument("--top", type = int, default = 15, help = "number of packages listed")
+    parser.add_argument("--repeat", type = int, default = 5, help = "number of runs")
+    parser.add_argument(
+        "--config", action = "append", default = [], metavar = "KEY=VALUE",
+        help = "override a configuration setting",
+    )
+    parser.add_argument("--run", action = "store_true", help = argparse.SUPPRESS)
+    args = parser.parse_args()
+    logging.basicConfig(level = logging.INFO, format = "%(message)s")
+    overrides = dict(setting.split("=", 1) for setting in args.config)
+
+    if args.run:
+        json.dump(run(overrides), sys.stdout)
+        return
+
+    runs = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        child = subprocess.run(  # noqa: S603
+            ( sys.executable, "-X", "importtime", __file__, "--run",
+              *(f"--config={setting}" for setting in args.config) ),
+            capture_output = True, check = True, text = True,
+        )
+        runs.append(( time.perf_counter() - start, json.loads(child.stdout), child.stderr ))
+    total, result, stderr = sorted(runs, key = operator.itemgetter(0))[len(runs) // 2]
+    imports = import_times(stderr)
+
+    log.info("startup: %.3fs, median of %d runs", total, len(runs))
+    log.info("  %.3fs importing modules", imports.total())
+    log.info(
+        "  %.3fs running the program, including its imports, registering %d resources",
+        result["wall_time"], result["resources"],
+    )
+    log.info("\nimports, by package:")
+    for group, seconds in imports.most_common(args.top):
+        log.info("  %7.3fs  %s", seconds, group)
+
+
+if __name__ == "__main__":
+    main()
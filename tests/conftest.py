@@ -0,0 +1,150 @@
+"""Run parts of the Pulumi program offline, with mocked resources, and measure them."""
+
+import asyncio
+import json
+import time
+import tracemalloc
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import pulumi
+import pytest
+from mocks import PROJECT, Mocks, config
+from pulumi.runtime.stack import wait_for_rpcs
+
+import artifacts
+import benchmark
+import gateway
+
+# Configuration used on top of `Pulumi.yaml`'s defaults
+CONFIG = {
+    "k8sEndpoint": "172.18.0.2:6443",
+}
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    parser.addoption(
+        "--update-baseline", action = "store_true",
+        help = "record measurements as the new performance baseline",
+    )
+
+
+@dataclass(frozen = True, slots = True)
+class Measurement:
+    """Cost of evaluating part of the program."""
+
+    wall_time: float     # seconds
+    peak_memory: int     # bytes allocated by Python, at the peak
+    resources: int       # number of resources registered
+    output_depth: int    # longest chain of `Output.apply`
+
+
+class _DepthTracker:
+    """Track the length of `Output.apply` chains, by wrapping `Output.apply`."""
+
+    KEY = "_test_apply_depth"
+
+    def __init__(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        self.max_depth = 0
+        apply = pulumi.Output.apply
+
+        def tracked(output: pulumi.Output, *args: Any, **kwargs: Any) -> pulumi.Output:  # noqa: ANN401
+            result = apply(output, *args, **kwargs)
+            depth = vars(output).get(self.KEY, 0) + 1
+            vars(result)[self.KEY] = depth
+            self.max_depth = max(self.max_depth, depth)
+            return result
+
+        monkeypatch.setattr(pulumi.Output, "apply", tracked)
+
+
+@pytest.fixture
+def measure(
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+) -> Iterator[Callable[[Callable[[], object]], Measurement]]:
+    """Evaluate a program under mocks, without network access, and measure it.
+
+    Yields:
+        a function running and measuring a program.
+
+    """
+    # Use placeholder artifacts, never fetched: mocked charts and manifests aren't rendered
+    monkeypatch.setattr(artifacts, "path", lambda artifact: tmp_path / artifact.filename)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    def evaluate(program: Callable[[], object], mocks: Mocks) -> None:
+        for singleton in ( gateway.crds, gateway.tls_route_crd, benchmark.job.namespace ):
+            singleton.cache_clear()
+        pulumi.runtime.set_mocks(mocks, project = PROJECT, stack = "test", preview = False)
+        pulumi.runtime.set_all_config(config(CONFIG))
+        program()
+        loop.run_until_complete(wait_for_rpcs())
+
+    def run(program: Callable[[], object]) -> Measurement:
+        # A first, unmeasured, evaluation imports the modules the program uses, so that
+        #  measurements don't depend on which programs ran before, e.g. when run on their own
+        evaluate(program, Mocks())
+        depth = _DepthTracker(monkeypatch)
+
+        # Keep the lowest of two measurements: one-off costs, such as the interpreter growing
+        #  its table of interned strings, otherwise land in whichever program crosses the line
+        measurements = []
+        for _ in range(2):
+            mocks = Mocks()
+            tracemalloc.start()
+            start = time.perf_counter()
+            evaluate(program, mocks)
+            wall_time = time.perf_counter() - start
+            _, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            measurements.append(( wall_time, peak_memory ))
+
+        return Measurement(
+            min(wall_time for wall_time, _ in measurements),
+            min(peak_memory for _, peak_memory in measurements),
+            mocks.resources, depth.max_depth,
+        )
+
+    yield run
+    loop.close()
+    asyncio.set_event_loop(None)
+
+
+def pytest_terminal_summary(terminalreporter: pytest.TerminalReporter) -> None:
+    """Report wall times, which depend too much on the machine and its load to be checked."""
+    times = [
+        (report.nodeid.rpartition("[")[2].rstrip("]"), dict(report.user_properties))
+        for report in terminalreporter.stats.get("passed", ())
+        if report.when == "call" and "wall_time" in dict(report.user_properties)
+    ]
+    if times:
+        terminalreporter.section("wall times")
+        for name, properties in times:
+            terminalreporter.write_line(
+                f"{name:<24}{properties['wall_time']:8.3f}s"
+                f"  (baseline {properties['baseline_wall_time']:.3f}s)",
+            )
+
+
+@pytest.fixture
+def baseline(request: pytest.FixtureRequest) -> Iterator[dict[str, dict[str, Any]]]:
+    """Load the stored measurements, rewriting them after the test with `--update-baseline`.
+
+    Yields:
+        measurements, by program name.
+
+    """
+    path = Path(__file__).parent / "baseline.json"
+    data = json.loads(path.read_text(encoding = "utf-8")) if path.exists() else {}
+    yield data
+    if request.config.getoption("--update-baseline"):
+        # re-read, as other tests may have updated the file in the meantime
+        stored = json.loads(path.read_text(encoding = "utf-8")) if path.exists() else {}
+        path.write_text(
+            json.dumps(stored | data, indent = 2, sort_keys = True) + "\n",
+            encoding = "utf-8",
+        )
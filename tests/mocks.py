@@ -0,0 +1,49 @@
+"""Mocked resources and configuration, to evaluate the program offline."""
+
+import json
+from collections.abc import Mapping
+from pathlib import Path
+
+import pulumi
+import yaml  # a development dependency, not needed by the program
+
+ROOT = Path(__file__).parent.parent
+PROJECT = "pyGraz-k8s"
+
+
+class Mocks(pulumi.runtime.Mocks):
+    """Echo resources' inputs as their outputs, and count them."""
+
+    def __init__(self) -> None:
+        """Start counting resources."""
+        self.resources = 0
+
+    def new_resource(self, args: pulumi.runtime.MockResourceArgs) -> tuple[str, dict]:
+        """Register a resource, with the outputs the program reads from charts and stacks."""
+        self.resources += 1
+        outputs = dict(args.inputs)
+        outputs.setdefault("metadata", {}).setdefault("name", args.name)
+        if args.typ.startswith("kubernetes:helm.sh/"):
+            outputs.setdefault("resources", [])
+        if args.typ == "pulumi:pulumi:StackReference":
+            outputs.setdefault("outputs", { "gateway-namespace": "gateway" })
+        return f"{args.name}_id", outputs
+
+    @staticmethod
+    def call(args: pulumi.runtime.MockCallArgs) -> dict:  # noqa: ARG004
+        """Answer function calls with no result."""
+        return {}
+
+
+def config(overrides: Mapping[str, str]) -> dict[str, str]:
+    """Merge the project's configuration defaults with `overrides`."""
+    project = yaml.safe_load((ROOT / "Pulumi.yaml").read_text(encoding = "utf-8"))
+    values = {
+        key: spec["default"]
+        for key, spec in project["config"].items()
+        if isinstance(spec, dict) and "default" in spec
+    } | dict(overrides)
+    return {
+        f"{PROJECT}:{key}": value if isinstance(value, str) else json.dumps(value)
+        for key, value in values.items()
+    }
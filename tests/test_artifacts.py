@@ -0,0 +1,53 @@
+"""Artifacts are only cached if they match their pinned digest."""
+
+import hashlib
+import json
+from pathlib import Path
+
+import pytest
+
+import artifacts
+
+ARTIFACT = artifacts.Artifact("example", "1.0.0", "https://example.com/example-1.0.0.yaml")
+CONTENTS = b"kind: Example\n"
+
+
+@pytest.fixture
+def download(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> Path:
+    """Use a temporary cache and lock file, and serve :py:data:`CONTENTS` as the artifact."""
+    monkeypatch.setattr(artifacts, "CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(artifacts, "LOCK", tmp_path / "artifacts.lock.json")
+
+    def _download(artifact: artifacts.Artifact, destination: Path) -> Path:
+        (destination / artifact.filename).write_bytes(CONTENTS)
+        return destination / artifact.filename
+
+    monkeypatch.setattr(artifacts, "_download", _download)
+    return artifacts.LOCK
+
+
+def test_unpinned_artifacts_are_refused(download: Path):
+    download.write_text("{}", encoding = "utf-8")
+    with pytest.raises(artifacts.ArtifactError, match = "no pinned digest"):
+        artifacts.fetch(ARTIFACT)
+    assert json.loads(download.read_text(encoding = "utf-8")) == {}
+
+
+def test_pin_then_fetch(download: Path):
+    cached = artifacts.fetch(ARTIFACT, pin = True)
+
+    digest = hashlib.sha256(CONTENTS).hexdigest()
+    assert json.loads(download.read_text(encoding = "utf-8")) == { ARTIFACT.key: digest }
+    assert artifacts.fetch(ARTIFACT) == cached
+
+
+def test_mismatching_artifacts_are_refused(download: Path):
+    download.write_text(json.dumps({ ARTIFACT.key: "0" * 64 }), encoding = "utf-8")
+    with pytest.raises(artifacts.ArtifactError, match = "expected"):
+        artifacts.fetch(ARTIFACT)
+
+
+def test_missing_lock_file_asks_for_bootstrap(download: Path):
+    with pytest.raises(artifacts.ArtifactError, match = "bootstrap it with"):
+        artifacts.fetch(ARTIFACT)
+    assert not download.exists()
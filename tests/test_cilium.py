@@ -0,0 +1,81 @@
+"""Cilium's feature checks, against the kernel the nodes share with the host, and chart values."""
+
+import typing
+
+import pulumi
+import pytest
+
+import cilium
+
+
+@pytest.mark.parametrize(("release", "version"), [
+    ( "6.1.0-18-amd64", (6, 1) ),
+    ( "5.15.0-105-generic", (5, 15) ),
+    ( "6.8.9-arch1-2", (6, 8) ),
+    ( "6.18", (6, 18) ),
+])
+def test_kernel_version(release: str, version: tuple[int, int]):
+    assert cilium.kernel_version(release) == version
+
+
+def test_kernel_version_rejects_garbage():
+    with pytest.raises(ValueError, match = "Cannot parse kernel release"):
+        cilium.kernel_version("unknown")
+
+
+@pytest.mark.parametrize("kernel", [ (5, 10), (5, 15), (6, 1) ])
+def test_default_datapath_runs_on_common_kernels(kernel: tuple[int, int]):
+    cilium.check({ "hubble", "bpf-host-routing", "native-routing" }, kernel)
+
+
+def test_all_features_on_recent_kernel():
+    cilium.check(set(typing.get_args(cilium.Feature)), (6, 8))
+
+
+@pytest.mark.parametrize(("features", "kernel", "error"), [
+    ( { "warp-drive" }, (6, 8), "Unknown Cilium features: warp-drive" ),
+    ( { "netkit" }, (6, 8), "'netkit' requires bpf-host-routing" ),
+    ( { "big-tcp", "bpf-host-routing" }, (6, 8), "'big-tcp' requires native-routing" ),
+    (
+        { "big-tcp", "bpf-host-routing", "native-routing" }, (6, 1),
+        "requires kernel 6.3, found 6.1",
+    ),
+    ( { "netkit", "bpf-host-routing" }, (5, 15), "requires kernel 6.8, found 5.15" ),
+])
+def test_check_rejects(features: set[str], kernel: tuple[int, int], error: str):
+    with pytest.raises(ValueError, match = error):
+        cilium.check(features, kernel)
+
+
+def test_images_referenced_by_tag():
+    # `kind load` only keeps tags, so preloaded images are only used if referenced by tag
+    values = cilium.values("localhost", "6443", set(typing.get_args(cilium.Feature)))
+    images = [
+        values["image"], values["operator"]["image"], values["certgen"]["image"],
+        values["envoy"]["image"], values["hubble"]["relay"]["image"],
+        values["hubble"]["ui"]["backend"]["image"], values["hubble"]["ui"]["frontend"]["image"],
+    ]
+
+    assert all(image["useDigest"] is False for image in images)
+
+
+@pytest.mark.parametrize(("name", "skipped"), [
+    ( "cilium:kube-system/hubble-relay", True ),
+    ( "cilium:kube-system/hubble-ui", True ),
+    ( "cilium:kube-system/cilium", False ),
+    ( "cilium:kube-system/cilium-operator", False ),
+])
+def test_chart_does_not_wait_for_hubble(name: str, skipped: bool):
+    props = { "metadata": { "name": name.rpartition("/")[2], "annotations": { "a": "b" } } }
+    result = cilium._skip_await_hubble(pulumi.ResourceTransformArgs(
+        custom = True, type_ = "kubernetes:apps/v1:Deployment", name = name,
+        props = props, opts = pulumi.ResourceOptions(),
+    ))
+
+    if skipped:
+        assert result is not None
+        assert result.props["metadata"]["annotations"] == {
+            "a": "b", "pulumi.com/skipAwait": "true",
+        }
+    else:
+        assert result is None
@@ -0,0 +1,25 @@
+"""The committed cluster configuration matches what `cluster.py` renders."""
+
+from pathlib import Path
+
+import pytest
+import yaml
+
+import cluster
+
+
+@pytest.mark.parametrize(("path", "contents"), cluster.render().items())
+def test_rendered_files_are_current(path: Path, contents: str):
+    assert path.read_text(encoding = "utf-8") == contents, (
+        f"{path.relative_to(cluster.ROOT)} is stale, run `python cluster.py render`"
+    )
+
+
+def test_kind_config_scales():
+    config = cluster.kind_config(workers = 8, parallel_pulls = 1, kubelet = { "maxPods": 250 })
+    kubelet = yaml.safe_load(config["kubeadmConfigPatches"][0])
+
+    assert [ node["role"] for node in config["nodes"] ] == [ "control-plane", *["worker"] * 8 ]
+    assert kubelet["serializeImagePulls"]
+    assert "maxParallelImagePulls" not in kubelet
+    assert kubelet["maxPods"] == 250  # noqa: PLR2004
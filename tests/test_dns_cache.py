@@ -0,0 +1,95 @@
+"""The DNS cache's upstreams, as configured before and after they could be listed, and policies."""
+
+import json
+
+import pulumi
+import pytest
+from mocks import PROJECT
+
+from dns import cache
+
+
+@pytest.mark.parametrize(("value", "expected"), [
+    ( "1.1.1.1", [ cache.Upstream("1.1.1.1") ] ),
+    (
+        "quic://9.9.9.9#dns.quad9.net",
+        [ cache.Upstream("9.9.9.9", "quic", tls_name = "dns.quad9.net") ],
+    ),
+    ( '"1.1.1.1"', [ cache.Upstream("1.1.1.1") ] ),
+    (
+        '["9.9.9.9", "tcp://[2620:fe::fe]:53"]',
+        [ cache.Upstream("9.9.9.9"), cache.Upstream("2620:fe::fe", "tcp", 53) ],
+    ),
+])
+def test_upstreams(value: str, expected: list[cache.Upstream]):
+    pulumi.runtime.set_all_config({ f"{PROJECT}:upstreamDns": value })
+
+    assert cache.upstreams(pulumi.Config(PROJECT)) == expected
+
+
+@pytest.mark.parametrize("spec", [ "tls://dns.quad9.net#dns.quad9.net", "one.one.one.one" ])
+def test_upstreams_must_be_ip_addresses(spec: str):
+    with pytest.raises(ValueError, match = "must be an IP address"):
+        cache.Upstream.parse(spec)
+
+
+@pytest.mark.parametrize(("value", "expected"), [ ( None, 2 ), ( "1", 1 ), ( "4", 4 ) ])
+def test_upstream_concurrency(value: str | None, expected: int):
+    pulumi.runtime.set_all_config({} if value is None else {
+        f"{PROJECT}:upstreamConcurrency": value,
+    })
+
+    assert cache.upstream_concurrency(pulumi.Config(PROJECT)) == expected
+
+
+@pytest.mark.parametrize("value", [ "0", "-1" ])
+def test_upstream_concurrency_must_be_positive(value: str):
+    pulumi.runtime.set_all_config({ f"{PROJECT}:upstreamConcurrency": value })
+
+    with pytest.raises(ValueError, match = "upstreamConcurrency must be at least 1"):
+        cache.upstream_concurrency(pulumi.Config(PROJECT))
+
+
+def test_cache_policy_maps_camel_case_keys_to_options():
+    policy = cache.CachePolicy.from_config({
+        "cacheSize": 8192, "positiveMaxTtl": 3600, "negativeMaxTtl": 0,
+    })
+
+    assert policy.options() == {
+        "cache_size": 8192, "positive_max_ttl": 3600, "negative_max_ttl": 0,
+    }
+
+
+@pytest.mark.parametrize(("obj", "message"), [
+    ( { "cache_size": 8192 }, "unknown DNS cache policy setting.*cache_size" ),
+    ( { "prefetch": True }, "unknown DNS cache policy setting.*prefetch" ),
+    ( { "cacheSize": -1 }, "cacheSize must be a non-negative integer" ),
+    ( { "negativeMaxTtl": True }, "negativeMaxTtl must be a non-negative integer" ),
+])
+def test_cache_policy_rejects_invalid_settings(obj: dict, message: str):
+    with pytest.raises(ValueError, match = message):
+        cache.CachePolicy.from_config(obj)
+
+
+def test_cache_policies_are_overriden_per_zone():
+    pulumi.runtime.set_all_config({ f"{PROJECT}:dnsCache": json.dumps({
+        "cacheSize": 8192,
+        "negativeMaxTtl": 300,
+        "zones": { "cluster.local": { "negativeMaxTtl": 5 } },
+    }) })
+
+    policies = cache.cache_policies(pulumi.Config(PROJECT), { "cluster.local", "." })
+
+    assert policies == {
+        "cluster.local": cache.CachePolicy(cache_size = 8192, negative_max_ttl = 5),
+        ".": cache.CachePolicy(cache_size = 8192, negative_max_ttl = 300),
+    }
+
+
+def test_cache_policies_reject_unknown_zones():
+    pulumi.runtime.set_all_config({ f"{PROJECT}:dnsCache": json.dumps({
+        "zones": { "example.com": { "negativeMaxTtl": 5 } },
+    }) })
+
+    with pytest.raises(ValueError, match = r"unknown zone.*example\.com"):
+        cache.cache_policies(pulumi.Config(PROJECT), { "cluster.local", "." })
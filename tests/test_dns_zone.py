@@ -0,0 +1,53 @@
+"""Zone files rendered for the DNS cache to serve authoritatively."""
+
+import pytest
+
+from dns import zone
+
+
+def _records(rendered: str) -> list[list[str]]:
+    """Split the zone's records, after its SOA and NS, into fields."""
+    return [ line.split() for line in rendered.split("\n\n", 1)[1].splitlines() ]
+
+
+def test_render():
+    rendered = zone.render("k8s.local", {
+        "cafe.k8s.local": [ "172.18.0.201", "fd00::c9", "172.18.0.200" ],
+        "*.apps.k8s.local": [ "172.18.0.202" ],
+        "k8s.local": [ "172.18.0.203" ],
+        "example.com": [ "192.0.2.1" ],
+        "notk8s.local": [ "192.0.2.2" ],
+    }, ttl = 30)
+
+    assert rendered.startswith("$ORIGIN k8s.local.\n$TTL 30\n")
+    assert _records(rendered) == [
+        [ "*.apps", "A", "172.18.0.202" ],
+        [ "cafe", "A", "172.18.0.200" ],
+        [ "cafe", "A", "172.18.0.201" ],
+        [ "cafe", "AAAA", "fd00::c9" ],
+        [ "@", "A", "172.18.0.203" ],
+    ]
+
+
+def test_render_normalizes_addresses():
+    rendered = zone.render("k8s.local", { "cafe.k8s.local": [ "fd00:0:0::00c9" ] })
+
+    assert _records(rendered) == [ [ "cafe", "AAAA", "fd00::c9" ] ]
+
+
+def test_render_rejects_invalid_addresses():
+    with pytest.raises(ValueError, match = "does not appear to be an IPv4 or IPv6 address"):
+        zone.render("k8s.local", { "cafe.k8s.local": [ "lb.example.com" ] })
+
+
+def test_serial_follows_the_records():
+    def serial(records: dict[str, list[str]]) -> str:
+        return next(
+            line.split()[0] for line in zone.render("k8s.local", records).splitlines()
+            if line.endswith("; Serial")
+        )
+
+    coffee = serial({ "coffee.k8s.local": [ "172.18.0.200" ] })
+    assert coffee == serial({ "coffee.k8s.local": [ "172.18.0.200" ] })
+    assert coffee != serial({ "coffee.k8s.local": [ "172.18.0.201" ] })
+    assert coffee != serial({ "tea.k8s.local": [ "172.18.0.200" ] })
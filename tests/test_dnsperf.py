@@ -0,0 +1,77 @@
+"""The DNS benchmark's durations, its load generator's search path expansion and its stub."""
+
+import struct
+
+import pytest
+
+from benchmark import dnsload, dnsperf, stub
+
+SEARCH = [ "default.svc.cluster.local", "svc.cluster.local", "cluster.local" ]
+
+
+@pytest.mark.parametrize(("duration", "seconds"), [
+    ( "30s", 30 ),
+    ( "2m", 120 ),
+    ( "1m30s", 90 ),
+    ( "1h2m3s", 3723 ),
+    ( "1.5m", 90 ),
+    ( "500ms", 0.5 ),
+])
+def test_seconds(duration: str, seconds: float):
+    assert dnsperf._seconds(duration) == pytest.approx(seconds)
+
+
+@pytest.mark.parametrize("duration", [ "30", "1d", "m30s", "1m 30s", "-1s", "" ])
+def test_seconds_rejects_garbage(duration: str):
+    with pytest.raises(ValueError, match = "unsupported duration"):
+        dnsperf._seconds(duration)
+
+
+@pytest.mark.parametrize(("name", "expected"), [
+    # absolute names are looked up as they are
+    ( "example.com.", [ "example.com." ] ),
+    # names with fewer than ndots dots go through the search path first
+    ( "kube-dns.kube-system", [
+        "kube-dns.kube-system.default.svc.cluster.local.",
+        "kube-dns.kube-system.svc.cluster.local.",
+        "kube-dns.kube-system.cluster.local.",
+        "kube-dns.kube-system.",
+    ] ),
+    # the others are tried as they are first
+    ( "a.b.c.d.e.f", [
+        "a.b.c.d.e.f.",
+        "a.b.c.d.e.f.default.svc.cluster.local.",
+        "a.b.c.d.e.f.svc.cluster.local.",
+        "a.b.c.d.e.f.cluster.local.",
+    ] ),
+])
+def test_candidates(name: str, expected: list[str]):
+    assert dnsload.candidates(name, SEARCH, 5) == expected
+
+
+def test_stub_answers_a_queries():
+    query = dnsload.query(0x1234, "www.bench.test.")
+
+    response = stub.answer(query)
+
+    ident, flags, qdcount, ancount = struct.unpack("!HHHH", response[:8])
+    assert (ident, flags, qdcount, ancount) == (0x1234, 0x8580, 1, 1)
+    # the question is echoed, followed by an answer pointing back at its name
+    assert response[12:len(query)] == query[12:]
+    assert response[len(query):] == (
+        struct.pack("!HHHIH", 0xC00C, 1, 1, stub.TTL, 4) + stub.ADDRESS
+    )
+
+
+def test_stub_answers_other_queries_without_records():
+    aaaa = dnsload.query(7, "www.bench.test.")[:-4] + b"\0\x1c\0\1"
+
+    response = stub.answer(aaaa)
+
+    assert struct.unpack("!HHHH", response[:8]) == (7, 0x8580, 1, 0)
+    assert response[12:] == aaaa[12:]
+
+
+def test_stub_rejects_truncated_queries():
+    with pytest.raises(ValueError, match = "not found"):
+        stub.answer(dnsload.query(7, "www.bench.test.")[:20])
@@ -0,0 +1,163 @@
+"""The OCI cache's evictor, on a temporary cache laid out like `ociregistry`'s."""
+
+import hashlib
+import importlib.util
+import json
+import os
+import sys
+from pathlib import Path
+from types import ModuleType
+
+import pytest
+from mocks import ROOT
+
+TOTAL = 10_000
+"""Capacity of the cache's volume, in bytes: the watermarks are 85% and 70% by default."""
+
+
+def _load(monkeypatch: pytest.MonkeyPatch, name: str) -> ModuleType:
+    """Load one of the scripts run next to the cache as a top-level module, as they are run."""
+    spec = importlib.util.spec_from_file_location(name, ROOT / "oci_cache" / f"{name}.py")
+    assert spec is not None
+    assert spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    monkeypatch.setitem(sys.modules, name, module)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def evict(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> ModuleType:
+    """Load `evict.py`, using a temporary cache and protected list."""
+    _load(monkeypatch, "distribution")
+    evict = _load(monkeypatch, "evict")
+
+    monkeypatch.setattr(evict, "CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(evict, "PROTECTED", tmp_path / "images")
+    monkeypatch.setattr(evict, "usage", lambda: (
+        sum(path.stat().st_size for path in evict.CACHE_DIR.rglob("*") if path.is_file()),
+        TOTAL,
+    ))
+    (tmp_path / "cache" / "blobs").mkdir(parents = True)
+    (tmp_path / "cache" / "img").mkdir()
+    return evict
+
+
+def blob(evict: ModuleType, size: int, used: float) -> str:
+    """Cache a blob of `size` bytes, last used at `used`, and return its hex digest."""
+    contents = os.urandom(size)
+    digest = hashlib.sha256(contents).hexdigest()
+    path = evict.CACHE_DIR / "blobs" / digest
+    path.write_bytes(contents)
+    os.utime(path, (used, used))
+    return digest
+
+
+def manifest(evict: ModuleType, image: str, digests: list[str], used: float) -> Path:
+    """Cache an image's manifest mentioning `digests`, last used at `used`."""
+    text = json.dumps({ "ImageUrl": image, "Layers": [ f"sha256:{d}" for d in digests ] })
+    path = evict.CACHE_DIR / "img" / hashlib.sha256(image.encode()).hexdigest()
+    path.write_text(text, encoding = "utf-8")
+    os.utime(path, (used, used))
+    return path
+
+
+def cached(evict: ModuleType) -> set[str]:
+    """List the cached files, by name."""
+    return { path.name for path in evict.CACHE_DIR.rglob("*") if path.is_file() }
+
+
+def test_below_high_watermark_nothing_is_evicted(evict: ModuleType):
+    layer = blob(evict, 7000, used = 1)
+    image = manifest(evict, "docker.io/library/old:1", [ layer ], used = 1)
+
+    evict.evict()
+
+    assert cached(evict) == { layer, image.name }
+
+
+def test_least_recently_used_images_are_evicted_first(evict: ModuleType):
+    old = blob(evict, 3000, used = 1)
+    old_manifest = manifest(evict, "docker.io/library/old:1", [ old ], used = 1)
+    # the manifest was pulled long ago, but the layer was read recently
+    recent = blob(evict, 3000, used = 3)
+    recent_manifest = manifest(evict, "docker.io/library/recent:1", [ recent ], used = 1)
+    new = blob(evict, 3000, used = 2)
+    new_manifest = manifest(evict, "docker.io/library/new:1", [ new ], used = 2)
+
+    evict.evict()
+
+    # 9000 bytes of blobs: evicting a single image gets under the low watermark
+    assert cached(evict) == { recent, recent_manifest.name, new, new_manifest.name }
+    assert not old_manifest.exists()
+
+
+def test_eviction_stops_under_the_low_watermark(evict: ModuleType):
+    images = [
+        manifest(evict, f"docker.io/library/image:{i}", [ blob(evict, 2000, used = i) ], used = i)
+        for i in range(1, 6)
+    ]
+
+    evict.evict()
+
+    # 10000 bytes of blobs, then 8000, then 6000: two images are evicted
+    assert [ image.exists() for image in images ] == [ False, False, True, True, True ]
+    assert evict.usage()[0] <= TOTAL * evict.LOW_WATERMARK // 100
+
+
+def test_blobs_still_mentioned_are_kept(evict: ModuleType):
+    shared = blob(evict, 4000, used = 1)
+    old = blob(evict, 4500, used = 1)
+    manifest(evict, "docker.io/library/old:1", [ shared, old ], used = 1)
+    new_manifest = manifest(evict, "docker.io/library/new:1", [ shared ], used = 2)
+
+    evict.evict()
+
+    assert cached(evict) == { shared, new_manifest.name }
+
+
+def test_orphan_blobs_are_evicted_first(evict: ModuleType):
+    layer = blob(evict, 4000, used = 1)
+    image = manifest(evict, "docker.io/library/image:1", [ layer ], used = 1)
+    blob(evict, 5000, used = 2)  # mentioned by no manifest
+
+    evict.evict()
+
+    assert cached(evict) == { layer, image.name }
+
+
+def test_protected_images_are_never_evicted(evict: ModuleType):
+    evict.PROTECTED.write_text("quay.io/cilium/cilium:v1.17.2\n", encoding = "utf-8")
+    layer = blob(evict, 4500, used = 1)
+    platform_digest = hashlib.sha256(b"platform").hexdigest()
+    platform = manifest(
+        evict, f"quay.io/cilium/cilium@sha256:{platform_digest}", [ layer ], used = 1,
+    )
+    # the index lists its platforms' manifests by digest
+    index = manifest(evict, "quay.io/cilium/cilium:v1.17.2", [ platform_digest ], used = 1)
+    other = blob(evict, 4500, used = 2)
+    other_manifest = manifest(evict, "docker.io/library/other:1", [ other ], used = 2)
+
+    assert evict.protected_digests(evict.manifests()) >= { platform_digest, layer }
+    evict.evict()
+
+    assert cached(evict) == { layer, platform.name, index.name }
+    assert not other_manifest.exists()
+
+
+def test_parse_inotify_events(evict: ModuleType):
+    def event(wd: int, mask: int, name: bytes) -> bytes:
+        padded = name.ljust(16, b"\0") if name else b""
+        return evict.EVENT.pack(wd, mask, 0, len(padded)) + padded
+
+    buffer = b"".join((
+        event(1, evict.IN_CLOSE_WRITE, b"sha256-blob"),
+        event(2, evict.IN_CREATE | evict.IN_ISDIR, b"img"),
+        event(1, evict.IN_CLOSE_NOWRITE, b""),
+    ))
+
+    assert list(evict.parse(buffer)) == [
+        ( 1, evict.IN_CLOSE_WRITE, "sha256-blob" ),
+        ( 2, evict.IN_CREATE | evict.IN_ISDIR, "img" ),
+        ( 1, evict.IN_CLOSE_NOWRITE, "" ),
+    ]
@@ -0,0 +1,77 @@
+"""Offline evaluation benchmark, failing when a module regresses past its baseline."""
+
+import runpy
+from collections.abc import Callable
+from dataclasses import asdict
+from typing import Any
+
+import pulumi
+import pytest
+from conftest import Measurement
+from mocks import PROJECT, ROOT
+
+import benchmark
+import cilium
+import dns
+import gateway
+import metrics
+import metrics_server
+import oci_cache
+
+# How much each measurement may exceed its baseline, as (factor, absolute slack)
+#  wall time is only reported, see `conftest.pytest_terminal_summary`
+TOLERANCES = {
+    "peak_memory": (1.25, 256 * 1024),
+    "resources": (1.0, 0),
+    "output_depth": (1.0, 0),
+}
+
+
+def _main(**config: str) -> Callable[[], object]:
+    """Run the whole program, with `config` set on top of the tests' configuration."""
+    def run() -> object:
+        for key, value in config.items():
+            pulumi.runtime.set_config(f"{PROJECT}:{key}", value)
+        return runpy.run_path(str(ROOT / "__main__.py"), run_name = "__main__")
+
+    return run
+
+
+PROGRAMS: dict[str, Callable[[], object]] = {
+    "__main__": _main(),
+    "__main__.platform": _main(layer = "platform"),
+    "__main__.apps": _main(layer = "apps", platformStack = "organization/pyGraz-k8s/platform"),
+    "benchmark.dnsperf": lambda: benchmark.dnsperf.deploy(pulumi.Config()),
+    "benchmark.fortio": lambda: benchmark.fortio.deploy(pulumi.Config(), [ "cafe.k8s.local" ]),
+    "cilium": lambda: cilium.deploy(pulumi.Config(), features = { "hubble" }),
+    "dns.cache": lambda: dns.cache.deploy(pulumi.Config()),
+    "oci_cache": lambda: oci_cache.deploy(pulumi.Config()),
+    "gateway": gateway.deploy,
+    "gateway.cilium": lambda: gateway.deploy(implementation = "cilium"),
+    "metrics": lambda: metrics.deploy(pulumi.Config(), gateway.deploy().ref),
+    "metrics_server": metrics_server.deploy,
+}
+
+
+@pytest.mark.parametrize("name", PROGRAMS)
+def test_evaluation_cost(
+    name: str,
+    measure: Callable[[Callable[[], object]], Measurement],
+    baseline: dict[str, dict[str, Any]],
+    request: pytest.FixtureRequest,
+):
+    measurement = asdict(measure(PROGRAMS[name]))
+    if request.config.getoption("--update-baseline") or name not in baseline:
+        baseline[name] = measurement
+        pytest.skip(f"recorded baseline for {name}: {measurement}")
+
+    request.node.user_properties.extend((
+        ( "wall_time", measurement["wall_time"] ),
+        ( "baseline_wall_time", baseline[name]["wall_time"] ),
+    ))
+    regressions = {
+        metric: f"{value} > {limit} (baseline {baseline[name][metric]})"
+        for metric, (factor, slack) in TOLERANCES.items()
+        if (value := measurement[metric]) > (limit := baseline[name][metric] * factor + slack)
+    }
+    assert not regressions, f"{name} regressed: {regressions}"
@@ -0,0 +1,33 @@
+"""Selecting a Helm chart's resources, as readiness handles."""
+
+from types import SimpleNamespace
+
+import pulumi
+import pulumi_kubernetes as k8s
+import pytest
+from mocks import PROJECT, Mocks
+
+import utils
+
+
+@pytest.fixture(autouse = True)
+def mocks() -> None:
+    pulumi.runtime.set_mocks(Mocks(), project = PROJECT, stack = "test", preview = False)
+
+
+@pulumi.runtime.test
+def test_chart_resource_selects_by_kind_and_name() -> pulumi.Output:
+    agent = k8s.apps.v1.DaemonSet("cilium", spec = {})
+    operator = k8s.apps.v1.Deployment("cilium-operator", spec = {})
+    relay = k8s.apps.v1.Deployment("hubble-relay", spec = {})
+    chart = SimpleNamespace(resources = pulumi.Output.from_input([ relay, operator, agent ]))
+
+    def check(selected: list[pulumi.Resource | None]) -> None:
+        assert selected == [ agent, operator, None ]
+
+    return pulumi.Output.all(
+        utils.chart_resource(chart, k8s.apps.v1.DaemonSet, "cilium"),
+        utils.chart_resource(chart, k8s.apps.v1.Deployment, "cilium-operator"),
+        # same name, other kind
+        utils.chart_resource(chart, k8s.apps.v1.Deployment, "cilium"),
+    ).apply(check)
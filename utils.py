@@ -4,11 +4,57 @@ The `k8s` module directly maps Kubernetes' APIs, which are relatively low-level
 This module is meant to “fill-in the gap” and provide terser, higher-level APIs.
 """
 
+from dataclasses import dataclass
+from typing import TypeVar
+
+import pulumi
 import pulumi_kubernetes as k8s
 
+R = TypeVar("R", bound = pulumi.Resource)
+
 
 def http_get(path: str, port: str | int = "http") -> k8s.core.v1.ProbeArgs:
     """Construct a liveness or readiness probe."""
     return k8s.core.v1.ProbeArgs(
         http_get = k8s.core.v1.HTTPGetActionArgs(path = path, port = port),
     )
+
+
+def tcp_socket(port: str | int) -> k8s.core.v1.ProbeArgs:
+    """Construct a probe checking a TCP port accepts connections."""
+    return k8s.core.v1.ProbeArgs(
+        tcp_socket = k8s.core.v1.TCPSocketActionArgs(port = port),
+    )
+
+
+def chart_resource(
+    chart: k8s.helm.v4.Chart,
+    kind: type[R],
+    name: str,
+) -> pulumi.Output[R | None]:
+    """Select a resource deployed by a Helm chart, by kind and name, or `None` if it has none.
+
+    The chart is a component whose `resources` only resolve once all of them are ready,
+    except those annotated with `pulumi.com/skipAwait`, so neither does the selected resource.
+    The resulting Output doesn't carry the chart's dependencies, though: in `depends_on`,
+    it adds a dependency on the selected resource only, e.g. for previews and deletions.
+    """
+    selected = chart.resources.apply(lambda resources: pulumi.Output.all(*(
+        resource.metadata.apply(lambda meta, resource = resource: (
+            resource if meta.name == name else None
+        ))
+        for resource in resources
+        if isinstance(resource, kind)
+    ))).apply(lambda matches: next(filter(None, matches), None))
+
+    return pulumi.Output(set(), selected.future(), selected.is_known(), selected.is_secret())
+
+
+@dataclass(frozen = True, slots = True)
+class Scaling:
+    """Horizontal autoscaling policy of a :py:func:`gateway.web_service`."""
+
+    min_replicas: int = 2
+    max_replicas: int = 10
+    cpu_utilization: int = 70
+    """Target average CPU usage, in percent of the pods' requests."""